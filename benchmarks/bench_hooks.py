@@ -0,0 +1,145 @@
+"""Measures the overhead the integration adds to every patched logging method.
+
+Each method is timed once as provided by the framework and once patched by
+`enable_tensorboard_logging_ctx`, with a run in Neptune's debug mode, so nothing
+leaves the process. Usage:
+
+    python benchmarks/bench_hooks.py --calls 500 --output hooks.json
+"""
+import tempfile
+from importlib.util import find_spec
+
+import click
+import numpy as np
+from common import (
+    time_calls,
+    write_results,
+)
+
+FRAMEWORKS = ("pytorch", "tensorboardx", "tensorflow")
+# Expensive calls are timed less often.
+SLOW_CALLS_DIVISOR = 10
+
+
+def summary_writer_workloads(writer):
+    """Workloads for `SummaryWriter` of PyTorch and tensorboardX, as {name: (call, is_slow)}."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    image = np.random.rand(3, 64, 64).astype(np.float32)
+    images = np.random.rand(16, 3, 64, 64).astype(np.float32)
+    figure, ax = plt.subplots()
+    ax.plot(np.random.rand(100))
+
+    # NOTE: Every call logs a slightly different image, so the dedup cache doesn't skip the conversion.
+    def add_image(i):
+        image[0, 0, 0] = (i % 1000) / 1000
+        writer.add_image("image", image, i)
+
+    def add_images(i):
+        images[0, 0, 0, 0] = (i % 1000) / 1000
+        writer.add_images("images", images, i)
+
+    def add_figure(i):
+        ax.set_title(str(i))
+        writer.add_figure("figure", figure, i, close=False)
+
+    return {
+        "add_scalar": (lambda i: writer.add_scalar("loss", 1 / (i + 1), i), False),
+        "add_image": (add_image, False),
+        "add_images": (add_images, True),
+        "add_figure": (add_figure, True),
+        "add_text": (lambda i: writer.add_text("text", f"step {i}", i), False),
+        "add_hparams": (lambda i: writer.add_hparams({"lr": 0.1, "batch_size": i}, {"acc": 0.5}), True),
+    }
+
+
+def tensorflow_workloads(writer):
+    import tensorflow as tf
+
+    images = np.random.rand(4, 64, 64, 3).astype(np.float32)
+
+    def with_writer(call):
+        def wrapper(i):
+            with writer.as_default():
+                call(i)
+
+        return wrapper
+
+    def image(i):
+        images[0, 0, 0, 0] = (i % 1000) / 1000
+        tf.summary.image("images", images, step=i, max_outputs=4)
+
+    return {
+        "scalar": (with_writer(lambda i: tf.summary.scalar("loss", 1 / (i + 1), step=i)), False),
+        "image": (with_writer(image), True),
+        "text": (with_writer(lambda i: tf.summary.text("text", f"step {i}", step=i)), False),
+    }
+
+
+def create_workloads(framework, log_dir):
+    if framework == "pytorch":
+        from torch.utils.tensorboard import SummaryWriter
+
+        return summary_writer_workloads(SummaryWriter(log_dir))
+    if framework == "tensorboardx":
+        from tensorboardX import SummaryWriter
+
+        return summary_writer_workloads(SummaryWriter(log_dir))
+
+    import tensorflow as tf
+
+    return tensorflow_workloads(tf.summary.create_file_writer(log_dir))
+
+
+def is_available(framework):
+    return find_spec({"pytorch": "torch", "tensorboardx": "tensorboardX", "tensorflow": "tensorflow"}[framework])
+
+
+@click.command()
+@click.option("--calls", type=click.IntRange(min=10), default=200, show_default=True, help="Timed calls per method")
+@click.option(
+    "--framework",
+    "frameworks",
+    type=click.Choice(FRAMEWORKS),
+    multiple=True,
+    help="Frameworks to benchmark, all installed ones by default",
+)
+@click.option("--async", "async_", is_flag=True, help="Benchmark the hooks with async_=True")
+@click.option("--output", type=click.Path(dir_okay=False), help="File the JSON results are written to")
+def main(calls, frameworks, async_, output):
+    import neptune
+
+    import neptune_tensorboard
+
+    frameworks = [framework for framework in frameworks or FRAMEWORKS if is_available(framework)]
+    results = []
+    with tempfile.TemporaryDirectory() as log_dir:
+        for framework in frameworks:
+            workloads = create_workloads(framework, log_dir)
+
+            baseline = {}
+            for name, (call, is_slow) in workloads.items():
+                baseline[name] = time_calls(call, calls // SLOW_CALLS_DIVISOR if is_slow else calls)
+
+            with neptune.init_run() as run:
+                with neptune_tensorboard.enable_tensorboard_logging_ctx(run, async_=async_):
+                    for name, (call, is_slow) in workloads.items():
+                        patched = time_calls(call, calls // SLOW_CALLS_DIVISOR if is_slow else calls)
+                        results.append(
+                            {
+                                "name": f"{framework}.{name}",
+                                "async": async_,
+                                "overhead_median_us": patched["median_us"] - baseline[name]["median_us"],
+                                "baseline": baseline[name],
+                                "patched": patched,
+                            }
+                        )
+
+    write_results("hooks", results, output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Measures how long importing the package takes and which frameworks it pulls in.
+
+Every import is timed in a fresh interpreter. Importing `neptune_tensorboard` must
+not import TensorFlow, PyTorch or tensorboardX, so the benchmark fails if any of them
+is loaded, or if the median import takes longer than `--max-seconds`. Usage:
+
+    python benchmarks/bench_import.py --repeat 5 --max-seconds 3 --output import.json
+"""
+import json
+import statistics
+import subprocess
+import sys
+
+import click
+from common import write_results
+
+MODULES = ("neptune_tensorboard", "neptune_tensorboard.sync")
+FRAMEWORK_MODULES = ("tensorflow", "torch", "tensorboardX")
+
+# Runs in the child interpreter, so the parent's imports don't count.
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": seconds,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "frameworks": [name for name in {frameworks!r} if name in sys.modules],
+}}))
+"""
+
+
+def probe(module):
+    code = PROBE.format(module=module, frameworks=FRAMEWORK_MODULES)
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+@click.command()
+@click.option("--repeat", type=click.IntRange(min=1), default=5, show_default=True, help="Imports timed per module")
+@click.option("--max-seconds", type=float, help="Fail if the median import of a module takes longer")
+@click.option("--output", type=click.Path(dir_okay=False), help="File the JSON results are written to")
+def main(repeat, max_seconds, output):
+    results, failures = [], []
+    for module in MODULES:
+        probes = [probe(module) for _ in range(repeat)]
+        result = {
+            "name": module,
+            "repeat": repeat,
+            "median_seconds": statistics.median(p["seconds"] for p in probes),
+            "max_seconds": max(p["seconds"] for p in probes),
+            "max_rss_mb": max(p["max_rss_mb"] for p in probes),
+            "frameworks_imported": sorted({name for p in probes for name in p["frameworks"]}),
+        }
+        results.append(result)
+
+        if result["frameworks_imported"]:
+            failures.append(f"{module} imports {', '.join(result['frameworks_imported'])}")
+        if max_seconds is not None and result["median_seconds"] > max_seconds:
+            failures.append(f"{module} takes {result['median_seconds']:.2f}s to import, more than {max_seconds}s")
+
+    write_results("import", results, output)
+    if failures:
+        raise click.ClickException("; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
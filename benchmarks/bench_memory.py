@@ -0,0 +1,83 @@
+"""Measures the peak memory of `DataSync` for event files of growing sizes.
+
+Every size is exported in a fresh interpreter, with runs in Neptune's offline
+mode, which queues the operations on disk instead of keeping them in memory.
+The memory used by the export should not depend on the size of the file. Usage:
+
+    python benchmarks/bench_memory.py --scalars 100000 --scalars 1000000 --max-growth-mb 50
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import click
+from bench_sync import (
+    directory_size,
+    write_event_files,
+)
+from common import write_results
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in the child interpreter, so the memory used by writing the files doesn't count.
+PROBE = """
+import json, resource, sys
+sys.path.insert(0, {benchmarks_dir!r})
+import common
+from neptune_tensorboard.sync import DataSync
+
+def max_rss_mb():
+    # NOTE: ru_maxrss survives exec, so it would report the peak of the parent process.
+    try:
+        with open("/proc/self/status") as file:
+            return next(int(line.split()[1]) for line in file if line.startswith("VmHWM")) / 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+data_sync = DataSync(project=None, api_token=None, path={log_dir!r}, mode="offline")
+baseline = max_rss_mb()
+data_sync.run()
+print(json.dumps({{"baseline_rss_mb": baseline, "peak_rss_mb": max_rss_mb()}}))
+"""
+
+
+def measure(log_dir, work_dir):
+    code = PROBE.format(benchmarks_dir=BENCHMARKS_DIR, log_dir=log_dir)
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True, cwd=work_dir
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+@click.command()
+@click.option("--scalars", type=click.IntRange(min=1), multiple=True, help="Scalar events of each measured file")
+@click.option("--images", type=click.IntRange(min=0), default=100, show_default=True, help="Image events per file")
+@click.option("--tags", type=click.IntRange(min=1), default=100, show_default=True, help="Distinct scalar tags")
+@click.option("--max-growth-mb", type=float, help="Fail if the peak memory grows more than this over the sizes")
+@click.option("--output", type=click.Path(dir_okay=False), help="File the JSON results are written to")
+def main(scalars, images, tags, max_growth_mb, output):
+    results = []
+    for scalar_count in sorted(scalars or (100_000, 1_000_000)):
+        with tempfile.TemporaryDirectory() as log_dir, tempfile.TemporaryDirectory() as work_dir:
+            write_event_files(log_dir, 1, scalar_count, images, tags)
+            measurement = measure(log_dir, work_dir)
+            results.append(
+                {
+                    "name": "memory",
+                    "events": scalar_count + images,
+                    "bytes": directory_size(log_dir),
+                    **measurement,
+                    "growth_rss_mb": measurement["peak_rss_mb"] - measurement["baseline_rss_mb"],
+                }
+            )
+
+    write_results("memory", results, output)
+    growth = results[-1]["growth_rss_mb"] - results[0]["growth_rss_mb"]
+    if max_growth_mb is not None and growth > max_growth_mb:
+        raise click.ClickException(f"The peak memory grew by {growth:.1f}MB, more than {max_growth_mb}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Measures the throughput of `DataSync` on a synthetic log directory.
+
+The log directory holds `--files` event files, each with `--scalars` scalar events
+and `--images` image events. The runs are created in Neptune's debug mode, so only
+the reading, decoding and batching is measured. With `--dry-run`, no run is created
+at all and the operations the export would queue are counted instead. Usage:
+
+    python benchmarks/bench_sync.py --files 8 --scalars 100000 --workers 4 --output sync.json
+"""
+import io
+import os
+import tempfile
+import time
+
+import click
+import numpy as np
+from common import write_results
+from PIL import Image
+
+
+def write_event_files(log_dir, files, scalars, images, tags):
+    from tensorboard.compat.proto import (
+        event_pb2,
+        summary_pb2,
+    )
+    from tensorboard.summary.writer.event_file_writer import EventFileWriter
+
+    with io.BytesIO() as buffer:
+        Image.fromarray((np.random.rand(64, 64, 3) * 255).astype(np.uint8)).save(buffer, format="PNG")
+        image = summary_pb2.Summary.Image(height=64, width=64, colorspace=3, encoded_image_string=buffer.getvalue())
+
+    for index in range(files):
+        writer = EventFileWriter(os.path.join(log_dir, f"run_{index}"), max_queue_size=1000)
+        for step in range(scalars):
+            value = summary_pb2.Summary.Value(tag=f"scalar_{step % tags}", simple_value=1 / (step + 1))
+            writer.add_event(
+                event_pb2.Event(wall_time=time.time(), step=step, summary=summary_pb2.Summary(value=[value]))
+            )
+        for step in range(images):
+            value = summary_pb2.Summary.Value(tag="image", image=image)
+            writer.add_event(
+                event_pb2.Event(wall_time=time.time(), step=step, summary=summary_pb2.Summary(value=[value]))
+            )
+        writer.close()
+
+
+def directory_size(log_dir):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(log_dir) for name in names)
+
+
+@click.command()
+@click.option("--files", type=click.IntRange(min=1), default=4, show_default=True, help="Number of event files")
+@click.option("--scalars", type=click.IntRange(min=0), default=20000, show_default=True, help="Scalar events per file")
+@click.option("--images", type=click.IntRange(min=0), default=20, show_default=True, help="Image events per file")
+@click.option("--tags", type=click.IntRange(min=1), default=10, show_default=True, help="Distinct scalar tags")
+@click.option("--workers", type=click.IntRange(min=1), multiple=True, help="Worker counts to benchmark [default: 1]")
+@click.option("--dry-run", is_flag=True, help="Only read and plan the export, without creating runs")
+@click.option("--output", type=click.Path(dir_okay=False), help="File the JSON results are written to")
+def main(files, scalars, images, tags, workers, dry_run, output):
+    from neptune_tensorboard.sync import DataSync
+
+    results = []
+    with tempfile.TemporaryDirectory() as log_dir:
+        write_event_files(log_dir, files, scalars, images, tags)
+        size = directory_size(log_dir)
+        events = files * (scalars + images)
+
+        for worker_count in workers or (1,):
+            # Every run exports the whole directory again, so the checkpoints of the previous one are removed.
+            for name in os.listdir(log_dir):
+                if name.startswith(".neptune-tensorboard"):
+                    os.remove(os.path.join(log_dir, name))
+
+            data_sync = DataSync(
+                project=None, api_token=None, path=log_dir, workers=worker_count, mode="debug", dry_run=dry_run
+            )
+
+            start = time.perf_counter()
+            data_sync.run()
+            seconds = time.perf_counter() - start
+
+            results.append(
+                {
+                    "name": "dry_run" if dry_run else "sync",
+                    "workers": worker_count,
+                    "files": files,
+                    "events": events,
+                    "bytes": size,
+                    "seconds": seconds,
+                    "events_per_second": events / seconds,
+                    "megabytes_per_second": size / seconds / 1e6,
+                }
+            )
+
+    write_results("sync", results, output)
+
+
+if __name__ == "__main__":
+    main()
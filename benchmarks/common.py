@@ -0,0 +1,73 @@
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+if sys.version_info >= (3, 8):
+    from importlib.metadata import (
+        PackageNotFoundError,
+        version,
+    )
+else:
+    from importlib_metadata import (
+        PackageNotFoundError,
+        version,
+    )
+
+# The benchmarks never reach a Neptune server.
+os.environ.setdefault("NEPTUNE_MODE", "debug")
+
+PACKAGES = ("neptune", "neptune-tensorboard", "torch", "tensorboardX", "tensorflow", "tensorboard")
+
+
+def time_calls(call, calls, warmup=10):
+    """Runs `call(i)` `calls` times and returns the statistics of a single call, in microseconds."""
+    for i in range(warmup):
+        call(i)
+
+    durations = []
+    for i in range(calls):
+        start = time.perf_counter()
+        call(i)
+        durations.append((time.perf_counter() - start) * 1e6)
+
+    durations.sort()
+    return {
+        "calls": calls,
+        "mean_us": statistics.mean(durations),
+        "median_us": statistics.median(durations),
+        "p95_us": durations[int(0.95 * (len(durations) - 1))],
+    }
+
+
+def write_results(benchmark, results, output):
+    """Writes the results as JSON to `output`, or prints them if it isn't given."""
+    report = {
+        "benchmark": benchmark,
+        "created_at": time.time(),
+        "environment": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "packages": _package_versions(),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+
+def _package_versions():
+    versions = {}
+    for package in PACKAGES:
+        try:
+            versions[package] = version(package)
+        except PackageNotFoundError:
+            pass
+    return versions
@@ -13,9 +13,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
-__all__ = ["enable_tensorboard_logging", "enable_tensorboard_logging_ctx", "__version__"]
+__all__ = ["enable_tensorboard_logging", "enable_tensorboard_logging_ctx", "ImagePolicy", "SamplingRule", "__version__"]
 
 from neptune_tensorboard.integration import (
+    ImagePolicy,
+    SamplingRule,
     __version__,
     enable_tensorboard_logging,
     enable_tensorboard_logging_ctx,
@@ -14,120 +14,237 @@
 # limitations under the License.
 #
 
-__all__ = ["enable_tensorboard_logging", "__version__"]
+__all__ = ["enable_tensorboard_logging", "ImagePolicy", "SamplingRule", "__version__"]
 
+import sys
 import warnings
 from contextlib import (
+    ExitStack,
     contextmanager,
-    nullcontext,
 )
+from functools import partial
 from importlib.util import find_spec
 
-from pkg_resources import parse_version
-
+from neptune_tensorboard.integration.images import ImagePolicy
+from neptune_tensorboard.integration.import_hooks import when_imported
+from neptune_tensorboard.integration.sampling import SamplingRule
+from neptune_tensorboard.integration.utils import (
+    AsyncHookDispatcher,
+    flush_before_sync,
+)
 from neptune_tensorboard.integration.version import __version__
 
-# NOTE: We don't use `importlib.find_spec` here as
-#       TF can be installed from multiple packages
-#       like tensorflow, tensorflow-macos, etc.
-IS_TF_AVAILABLE = True
-try:
-    import tensorflow as tf  # noqa
-except ModuleNotFoundError:
-    IS_TF_AVAILABLE = False
-
-IS_PYT_AVAILABLE = find_spec("torch")
-IS_TENSORBOARDX_AVAILABLE = find_spec("tensorboardX")
-
-if IS_TF_AVAILABLE:
-    MIN_TF_VERSION = "2.0.0-rc0"
-    from neptune_tensorboard.integration.tensorflow_integration import (
-        NeptuneTensorflowTracker,
-        patch_tensorflow,
+if sys.version_info >= (3, 8):
+    from importlib.metadata import (
+        PackageNotFoundError,
+        version,
+    )
+else:
+    from importlib_metadata import (
+        PackageNotFoundError,
+        version,
     )
 
-    def check_tf_version():
-        version = "<unknown>"
+# NOTE: The frameworks are detected without being imported, as importing
+#       TensorFlow alone takes seconds. TF can be installed from multiple
+#       packages like tensorflow, tensorflow-macos, etc., so all of them are
+#       looked up, with the module spec as a fallback for builds without metadata.
+TF_DISTRIBUTIONS = (
+    "tensorflow",
+    "tensorflow-cpu",
+    "tensorflow-gpu",
+    "tensorflow-macos",
+    "tensorflow-intel",
+    "tensorflow-aarch64",
+    "tensorflow-rocm",
+    "tf-nightly",
+)
+
+
+def _is_any_distribution_installed(distributions):
+    for distribution in distributions:
         try:
-            # noinspection PyUnresolvedReferences
-            version = parse_version(tf.version.VERSION)
+            version(distribution)
+            return True
+        except PackageNotFoundError:
+            pass
+    return False
 
-            if version >= parse_version(MIN_TF_VERSION):
-                return
-        except AttributeError:
-            # user facing
-            message = (
-                f"Unrecognized TensorFlow version: {version}. Please make sure "
-                "that the TensorFlow version is >={MIN_TF_VERSION}"
-            )
-            raise Exception(message)
 
+IS_TF_AVAILABLE = _is_any_distribution_installed(TF_DISTRIBUTIONS) or find_spec("tensorflow") is not None
+IS_PYT_AVAILABLE = find_spec("torch") is not None
+IS_TENSORBOARDX_AVAILABLE = find_spec("tensorboardX") is not None
 
-if IS_PYT_AVAILABLE:
-    MIN_PT_VERSION = "1.9.0"
-    import torch
+MIN_TF_VERSION = "2.0.0-rc0"
+MIN_PT_VERSION = "1.9.0"
+MIN_TBX_VERSION = "2.2.0"
 
-    from neptune_tensorboard.integration.pytorch_integration import (
-        NeptunePytorchTracker,
-        patch_pytorch,
-    )
+# framework -> (top-level module, whether it is installed)
+FRAMEWORKS = {
+    "tensorflow": ("tensorflow", IS_TF_AVAILABLE),
+    "pytorch": ("torch", IS_PYT_AVAILABLE),
+    "tensorboardx": ("tensorboardX", IS_TENSORBOARDX_AVAILABLE),
+}
 
-    def check_pytorch_version():
-        version = "<unknown>"
-        try:
-            # noinspection PyUnresolvedReferences
-            version = parse_version(torch.__version__)
+# user facing
+FRAMEWORK_NOT_FOUND_WARNING_MSG = (
+    "neptune-tensorboard: TensorFlow or PyTorch or tensorboardX was not found, ",
+    "please ensure that it is available.",
+)
 
-            if version >= parse_version(MIN_PT_VERSION):
-                return
-        except AttributeError:
-            # user facing
-            message = (
-                f"Unrecognized PyTorch version: {version}. Please make sure "
-                "that the PyTorch version is >={MIN_PT_VERSION}"
-            )
-            raise Exception(message)
+
+def check_tf_version():
+    import tensorflow as tf
+    from pkg_resources import parse_version
+
+    version = "<unknown>"
+    try:
+        # noinspection PyUnresolvedReferences
+        version = parse_version(tf.version.VERSION)
+
+        if version >= parse_version(MIN_TF_VERSION):
+            return
+    except AttributeError:
+        # user facing
+        message = (
+            f"Unrecognized TensorFlow version: {version}. Please make sure "
+            "that the TensorFlow version is >={MIN_TF_VERSION}"
+        )
+        raise Exception(message)
+
+
+def check_pytorch_version():
+    import torch
+    from pkg_resources import parse_version
+
+    version = "<unknown>"
+    try:
+        # noinspection PyUnresolvedReferences
+        version = parse_version(torch.__version__)
+
+        if version >= parse_version(MIN_PT_VERSION):
+            return
+    except AttributeError:
+        # user facing
+        message = (
+            f"Unrecognized PyTorch version: {version}. Please make sure "
+            "that the PyTorch version is >={MIN_PT_VERSION}"
+        )
+        raise Exception(message)
 
 
-if IS_TENSORBOARDX_AVAILABLE:
+def check_tensorboardx_version():
     import tensorboardX
+    from pkg_resources import parse_version
+
+    version = "<unknown>"
+    try:
+        # noinspection PyUnresolvedReferences
+        version = parse_version(tensorboardX.__version__)
+
+        if version >= parse_version(MIN_TBX_VERSION):
+            return
+    except AttributeError:
+        # user facing
+        message = (
+            f"Unrecognized tensorboardX version: {version}. Please make sure "
+            "that the tensorboardX version is >={MIN_TBX_VERSION}"
+        )
+        raise Exception(message)
+
+
+def _load_integration(framework):
+    """Imports the integration of `framework` and returns its patch function and tracker class."""
+    if framework == "tensorflow":
+        check_tf_version()
+        from neptune_tensorboard.integration.tensorflow_integration import (
+            NeptuneTensorflowTracker,
+            patch_tensorflow,
+        )
+
+        return patch_tensorflow, NeptuneTensorflowTracker
+    if framework == "pytorch":
+        check_pytorch_version()
+        from neptune_tensorboard.integration.pytorch_integration import (
+            NeptunePytorchTracker,
+            patch_pytorch,
+        )
 
-    MIN_TBX_VERSION = "2.2.0"
+        return patch_pytorch, NeptunePytorchTracker
+
+    check_tensorboardx_version()
     from neptune_tensorboard.integration.tensorboardx_integration import (
         NeptuneTensorboardXTracker,
         patch_tensorboardx,
     )
 
-    def check_tensorboardx_version():
-        version = "<unknown>"
-        try:
-            # noinspection PyUnresolvedReferences
-            version = parse_version(tensorboardX.__version__)
-
-            if version >= parse_version(MIN_TBX_VERSION):
-                return
-        except AttributeError:
+    return patch_tensorboardx, NeptuneTensorboardXTracker
+
+
+def _select_frameworks(frameworks=None):
+    """Returns the requested frameworks which are installed, by default all the installed ones."""
+    if frameworks is None:
+        installed = [framework for framework, (_, is_installed) in FRAMEWORKS.items() if is_installed]
+        if not installed:
+            warnings.warn(FRAMEWORK_NOT_FOUND_WARNING_MSG)
+        return installed
+
+    if isinstance(frameworks, str):
+        frameworks = [frameworks]
+    unknown = [framework for framework in frameworks if framework not in FRAMEWORKS]
+    if unknown:
+        # user facing
+        raise ValueError(
+            f"neptune-tensorboard: Unknown frameworks: {', '.join(map(str, unknown))}."
+            f" The supported ones are: {', '.join(FRAMEWORKS)}."
+        )
+
+    selected = []
+    for framework in dict.fromkeys(frameworks):
+        if FRAMEWORKS[framework][1]:
+            selected.append(framework)
+        else:
             # user facing
-            message = (
-                f"Unrecognized tensorboardX version: {version}. Please make sure "
-                "that the tensorboardX version is >={MIN_TBX_VERSION}"
-            )
-            raise Exception(message)
-
-
-# user facing
-FRAMEWORK_NOT_FOUND_WARNING_MSG = (
-    "neptune-tensorboard: TensorFlow or PyTorch or tensorboardX was not found, ",
-    "please ensure that it is available.",
-)
-
-
-def enable_tensorboard_logging(run, *, base_namespace="tensorboard"):
+            warnings.warn(f"neptune-tensorboard: {framework} was selected, but it isn't installed. Skipping it.")
+    return selected
+
+
+def enable_tensorboard_logging(
+    run,
+    *,
+    base_namespace="tensorboard",
+    async_=False,
+    max_queue=1000,
+    backpressure="block",
+    image_grid=False,
+    image_policy=None,
+    graph_format="png",
+    instrument=False,
+    sampling=None,
+    frameworks=None,
+):
     """Logs the tracked metadata to both the tensorboard directory and a Neptune run.
 
     Args:
         run: An existing run reference, as returned by `neptune.init_run()`.
         base_namespace: Namespace under which all metadata logged by the integration will be stored.
+        async_: Whether to log the metadata to Neptune from a background thread instead of the training loop.
+            The pending calls are processed before the run is stopped.
+        max_queue: With `async_=True`, maximum number of logging calls waiting to be processed.
+        backpressure: With `async_=True`, what to do when the queue of pending calls is full. One of
+            "block" (wait for a free slot), "drop_oldest" or "sample" (keep only a fraction of the calls).
+        image_grid: Whether to upload each batch of images as a single mosaic instead of one image per element.
+        image_policy: An `ImagePolicy` deciding how images are downsampled, encoded and sampled before they are
+            uploaded. By default, all images are uploaded as full-resolution PNGs.
+        graph_format: How model graphs are uploaded. Either "png", rendered with Graphviz off the training
+            thread, or "dot", which uploads the graph definition as text.
+        instrument: Whether to measure how much time each hooked method costs. The measurements are reported
+            to the `monitoring/neptune_tensorboard` namespace of the run.
+        sampling: A list of `SamplingRule`s limiting how often the scalars and texts of the matching tags are
+            mirrored to Neptune. The first rule matching a tag applies. By default, every value is mirrored.
+        frameworks: The frameworks to log from, any of "tensorflow", "pytorch" and "tensorboardx". They are
+            imported if necessary. By default, all the installed frameworks are used, each one being patched
+            once it is imported, whether before or after the logging is enabled.
 
     Example:
         >>> import neptune
@@ -139,37 +256,96 @@ def enable_tensorboard_logging(run, *, base_namespace="tensorboard"):
     - Integration guide: https://docs.neptune.ai/integrations/tensorboard/
     - API reference: https://docs.neptune.ai/api/integrations/tensorboard/
     """
-    if IS_TF_AVAILABLE:
-        check_tf_version()
-        patch_tensorflow(run, base_namespace)
-    if IS_PYT_AVAILABLE:
-        check_pytorch_version()
-        patch_pytorch(run, base_namespace)
-    if IS_TENSORBOARDX_AVAILABLE:
-        check_tensorboardx_version()
-        patch_tensorboardx(run, base_namespace)
-
-    if not (IS_PYT_AVAILABLE or IS_TF_AVAILABLE or IS_TENSORBOARDX_AVAILABLE):
-        warnings.warn(FRAMEWORK_NOT_FOUND_WARNING_MSG)
+    dispatcher = None
+    if async_:
+        dispatcher = AsyncHookDispatcher(max_queue=max_queue, backpressure=backpressure)
+    options = dict(
+        dispatcher=dispatcher,
+        image_grid=image_grid,
+        image_policy=image_policy,
+        graph_format=graph_format,
+        instrument=instrument,
+        sampling=sampling,
+    )
 
+    trackers = []
 
-@contextmanager
-def enable_tensorboard_logging_ctx(run, *, base_namespace="tensorboard"):
-    tf_tracker, pt_tracker, tbx_tracker = nullcontext(), nullcontext(), nullcontext()
-    if IS_TF_AVAILABLE:
-        check_tf_version()
-        tf_tracker = NeptuneTensorflowTracker(run, base_namespace)
+    def patch_framework(framework):
+        patch, _ = _load_integration(framework)
+        tracker = patch(run, base_namespace, **options)
+        # NOTE: frameworks which were already patched return no tracker
+        if tracker is not None:
+            trackers.append(tracker)
 
-    if IS_PYT_AVAILABLE:
-        check_pytorch_version()
-        pt_tracker = NeptunePytorchTracker(run, base_namespace)
+    # NOTE: By default, the frameworks are patched once they are imported, so that
+    #       enabling the logging doesn't import them, nor depends on the import order.
+    for framework in _select_frameworks(frameworks):
+        if frameworks is None:
+            when_imported(FRAMEWORKS[framework][0], partial(patch_framework, framework))
+        else:
+            patch_framework(framework)
+    flush_before_sync(run, partial(_flush, trackers, dispatcher), close=partial(_close, trackers, dispatcher))
 
-    if IS_TENSORBOARDX_AVAILABLE:
-        check_tensorboardx_version()
-        tbx_tracker = NeptuneTensorboardXTracker(run, base_namespace)
 
-    if not (IS_PYT_AVAILABLE or IS_TF_AVAILABLE or IS_TENSORBOARDX_AVAILABLE):
-        warnings.warn(FRAMEWORK_NOT_FOUND_WARNING_MSG)
+@contextmanager
+def enable_tensorboard_logging_ctx(
+    run,
+    *,
+    base_namespace="tensorboard",
+    async_=False,
+    max_queue=1000,
+    backpressure="block",
+    image_grid=False,
+    image_policy=None,
+    graph_format="png",
+    instrument=False,
+    sampling=None,
+    frameworks=None,
+):
+    dispatcher = None
+    if async_:
+        dispatcher = AsyncHookDispatcher(max_queue=max_queue, backpressure=backpressure)
+    options = dict(
+        dispatcher=dispatcher,
+        image_grid=image_grid,
+        image_policy=image_policy,
+        graph_format=graph_format,
+        instrument=instrument,
+        sampling=sampling,
+    )
 
-    with pt_tracker, tf_tracker, tbx_tracker:
-        yield
+    trackers = []
+    restore = flush_before_sync(run, partial(_flush, trackers, dispatcher), close=partial(_close, trackers, dispatcher))
+    try:
+        with ExitStack() as stack:
+
+            def patch_framework(framework):
+                _, tracker_cls = _load_integration(framework)
+                trackers.append(stack.enter_context(tracker_cls(run, base_namespace, **options)))
+
+            for framework in _select_frameworks(frameworks):
+                if frameworks is None:
+                    # NOTE: The frameworks imported after the context has exited are left as they are.
+                    stack.callback(when_imported(FRAMEWORKS[framework][0], partial(patch_framework, framework)))
+                else:
+                    patch_framework(framework)
+            yield
+    finally:
+        _close(trackers, dispatcher)
+        restore()
+
+
+def _flush(trackers, dispatcher):
+    if dispatcher is not None:
+        dispatcher.flush()
+    for tracker in trackers:
+        tracker.flush()
+
+
+def _close(trackers, dispatcher):
+    # NOTE: The calls still waiting in the queue have to reach
+    #       the trackers before their buffers are flushed.
+    if dispatcher is not None:
+        dispatcher.close()
+    for tracker in trackers:
+        tracker.flush()
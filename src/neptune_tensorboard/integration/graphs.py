@@ -0,0 +1,99 @@
+__all__ = ["GraphRenderer", "IS_GRAPHVIZ_AVAILABLE", "graph_def_digraph", "graph_def_signature"]
+
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+
+from neptune.types import File
+
+from neptune_tensorboard.integration.utils import content_digest
+
+GRAPH_FORMATS = ("png", "dot")
+
+IS_GRAPHVIZ_AVAILABLE = find_spec("graphviz") is not None
+
+
+def graph_def_signature(graph_data):
+    """Digest of a `tf.Graph` or `GraphDef`."""
+    if hasattr(graph_data, "as_graph_def"):
+        graph_data = graph_data.as_graph_def()
+    return content_digest(graph_data.SerializeToString(deterministic=True))
+
+
+def graph_def_digraph(graph_def):
+    """Builds a `graphviz.Digraph` of a `GraphDef`, e.g. the one TensorBoard traces from a torch module."""
+    import graphviz
+
+    digraph = graphviz.Digraph(node_attr={"shape": "box", "fontsize": "10"})
+    for node in graph_def.node:
+        digraph.node(node.name, label=f"{node.name.rsplit('/', 1)[-1]}\n{node.op}")
+        for input_name in node.input:
+            # NOTE: Inputs are named "<node>:<output>", or "^<node>" for control dependencies.
+            digraph.edge(input_name.lstrip("^").split(":")[0], node.name)
+    return digraph
+
+
+class GraphRenderer:
+    """Uploads model graphs, rendering each model structure at most once and off the training thread.
+
+    With `format="png"`, graphs are rendered by Graphviz on a background thread. With `format="dot"`,
+    their DOT source is uploaded as it is, which needs neither a rendering nor the Graphviz binaries.
+    """
+
+    def __init__(self, format="png"):
+        if format not in GRAPH_FORMATS:
+            # user facing
+            raise ValueError(f"neptune-tensorboard: `graph_format` must be one of {GRAPH_FORMATS}, got {format!r}.")
+
+        self._format = format
+        self._signatures = set()
+        self._pending = []
+        self._lock = threading.Lock()
+        # NOTE: The thread is only started once the first graph is submitted.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="neptune-tensorboard-graphs")
+
+    def is_new(self, signature):
+        """Returns whether a graph with this signature is neither uploaded nor being uploaded."""
+        with self._lock:
+            return signature not in self._signatures
+
+    def upload(self, handlers, graph, signature=None):
+        """Uploads a `graphviz.Digraph` to the `graph` attribute.
+
+        Its `signature` is recorded while the graph is rendered, and forgotten if rendering it fails,
+        so that only the graphs which were uploaded are skipped by `is_new()`.
+        """
+        with self._lock:
+            self._signatures.add(signature)
+        if self._format == "dot":
+            self._render(handlers, graph, "dot", signature)
+            return
+
+        future = self._executor.submit(self._render, handlers, graph, "png", signature)
+        with self._lock:
+            self._pending.append(future)
+
+    def flush(self):
+        """Waits until the graphs submitted so far are uploaded."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for future in pending:
+            try:
+                future.result()
+            except Exception as e:
+                # user facing
+                warnings.warn(f"neptune-tensorboard: Rendering the model graph failed: {e}")
+
+    def _render(self, handlers, graph, extension, signature):
+        try:
+            content = graph.source.encode() if extension == "dot" else graph.pipe(format=extension)
+            self._upload(handlers, content, extension)
+        except Exception:
+            with self._lock:
+                self._signatures.discard(signature)
+            raise
+
+    def _upload(self, handlers, content, extension):
+        if not handlers.is_repeated("graph", None, content_digest(content), series=False):
+            handlers.get("graph").upload(File.from_content(content, extension=extension))
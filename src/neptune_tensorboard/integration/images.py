@@ -0,0 +1,309 @@
+__all__ = ["ImagePolicy", "ImageConverter", "image_as_batch", "to_uint8_batch", "make_grid", "encode_images"]
+
+import io
+import math
+import os
+import threading
+import uuid
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+from neptune.types import File
+from PIL import Image
+
+from neptune_tensorboard.integration.utils import (
+    ContentCache,
+    content_digest,
+)
+
+IMAGE_FORMATS = ("png", "jpeg", "webp")
+ENCODING_WORKERS = min(4, os.cpu_count() or 1)
+
+_encoding_pool = None
+_encoding_pool_lock = threading.Lock()
+
+
+class ImagePolicy:
+    """Decides how images are downsampled, encoded and sampled before they are uploaded.
+
+    Args:
+        max_resolution: Images whose longer side exceeds it (in pixels) are downscaled, keeping the aspect ratio.
+            By default, images are uploaded in full resolution.
+        format: Encoding of the uploaded images, one of "png" (lossless), "jpeg" or "webp".
+        quality: With "jpeg" or "webp", the encoding quality, from 1 to 100.
+        every_n: Only every n-th image of a tag is uploaded.
+        max_per_tag: Maximum number of images uploaded per tag. By default, there is no limit.
+
+    Example:
+        >>> from neptune_tensorboard import ImagePolicy, enable_tensorboard_logging
+        >>> policy = ImagePolicy(max_resolution=256, format="jpeg", every_n=10)
+        >>> enable_tensorboard_logging(run, image_policy=policy)
+    """
+
+    def __init__(self, max_resolution=None, format="png", quality=85, every_n=1, max_per_tag=None):
+        if format not in IMAGE_FORMATS:
+            # user facing
+            raise ValueError(f"neptune-tensorboard: `format` must be one of {IMAGE_FORMATS}, got {format!r}.")
+        if not 1 <= quality <= 100:
+            # user facing
+            raise ValueError(f"neptune-tensorboard: `quality` must be between 1 and 100, got {quality}.")
+        if every_n < 1:
+            # user facing
+            raise ValueError(f"neptune-tensorboard: `every_n` must be a positive integer, got {every_n}.")
+        for name, value in (("max_resolution", max_resolution), ("max_per_tag", max_per_tag)):
+            if value is not None and value < 1:
+                # user facing
+                raise ValueError(f"neptune-tensorboard: `{name}` must be a positive integer or None, got {value}.")
+
+        self.max_resolution = max_resolution
+        self.format = format
+        self.quality = quality
+        self.every_n = every_n
+        self.max_per_tag = max_per_tag
+
+    @property
+    def reencodes(self):
+        """Whether images which are already encoded have to be decoded and encoded again."""
+        return self.max_resolution is not None or self.format != "png"
+
+    def encode(self, image):
+        """Downscales and encodes a PIL image, returning its content and file extension."""
+        if self.max_resolution is not None and max(image.size) > self.max_resolution:
+            image.thumbnail((self.max_resolution, self.max_resolution), Image.BILINEAR)
+
+        options = {}
+        if self.format != "png":
+            options["quality"] = self.quality
+        if self.format == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        with io.BytesIO() as buffer:
+            image.save(buffer, format=self.format.upper(), **options)
+            return buffer.getvalue(), self.format
+
+
+class ImageConverter:
+    """Samples and converts the images logged under each tag according to an `ImagePolicy`.
+
+    With `grid=True`, every batch of images is tiled into a single mosaic. Images are
+    identified by a digest of their raw bytes: encoded images are reused from `cache`,
+    and a payload already uploaded to the series of its tag isn't uploaded again. The
+    uploads are remembered in `cache` too, so only as far back as it reaches. An image
+    which isn't appended to a series only replaces the previous one, so it is uploaded
+    again unless it's identical to the previous one of its tag.
+    """
+
+    def __init__(self, policy=None, grid=False, cache=None):
+        self.policy = policy or ImagePolicy()
+        self._grid = grid
+        self._cache = cache or ContentCache()
+        # NOTE: The uploads are remembered per converter, as the cache may be
+        #       shared with converters which upload to other runs.
+        self._scope = uuid.uuid4().bytes
+        self._counts = {}
+        self._last_digests = {}
+        self._lock = threading.Lock()
+
+    def sample(self, tag, n):
+        """Counts `n` new images of `tag` and returns the indices of the ones which should be uploaded."""
+        with self._lock:
+            seen, uploaded = self._counts.get(tag, (0, 0))
+            indices = []
+            for index in range(n):
+                if (seen + index) % self.policy.every_n == 0 and (
+                    self.policy.max_per_tag is None or uploaded < self.policy.max_per_tag
+                ):
+                    indices.append(index)
+                    uploaded += 1
+            self._counts[tag] = (seen + n, uploaded)
+            return indices
+
+    def state(self):
+        """Returns how many images of every tag were seen and uploaded so far, as JSON-compatible data."""
+        with self._lock:
+            return {tag: list(counts) for tag, counts in self._counts.items()}
+
+    def restore(self, state):
+        """Continues from a `state()`, e.g. saved by an earlier export, keeping the highest counts."""
+        with self._lock:
+            for tag, (seen, uploaded) in state.items():
+                current_seen, current_uploaded = self._counts.get(tag, (0, 0))
+                self._counts[tag] = (max(current_seen, seen), max(current_uploaded, uploaded))
+
+    def convert(self, tag, images, dataformats="NHWC", series=True):
+        """Converts the sampled images of a NCHW or NHWC batch to `File`s ready to be uploaded.
+
+        Pass `series=False` if the images replace the previous ones instead of being appended to a series.
+        """
+        images = _as_numpy(images)
+        indices = self.sample(tag, len(images))
+        if not indices:
+            return []
+        if len(indices) < len(images):
+            images = images[_as_slice(indices)]
+
+        # NOTE: The uint8 batch is the only copy of the images made before they are encoded,
+        #       so it is also what the repeated images are recognized by.
+        batch = to_uint8_batch(images, dataformats)
+        header = f"{batch.shape[1:]}".encode()
+        digests = [content_digest(header, image) for image in batch]
+        grid = self._grid and len(batch) > 1
+        if grid:
+            digests = [content_digest(*digests)]
+        if self._is_repeated(tag, digests, series):
+            return []
+
+        encoded = [self._cache.get(digest) for digest in digests]
+        missing = [index for index, payload in enumerate(encoded) if payload is None]
+        if missing:
+            batch = make_grid(batch)[np.newaxis] if grid else batch[missing]
+            for index, payload in zip(missing, encode_images(batch, self.policy)):
+                encoded[index] = payload
+                self._cache.put(digests[index], payload, len(payload[0]))
+
+        return [File.from_content(content, extension=extension) for content, extension in encoded]
+
+    def convert_encoded(self, tag, content, extension):
+        """Applies the policy to an already encoded image of a series, returning None if it shouldn't be uploaded."""
+        if not self.sample(tag, 1):
+            return None
+        digest = content_digest(content)
+        if self._is_repeated(tag, [digest], series=True):
+            return None
+        if not self.policy.reencodes:
+            return File.from_content(content, extension=extension)
+
+        payload = self._cache.get(digest)
+        if payload is None:
+            with Image.open(io.BytesIO(content)) as image:
+                image.load()
+                payload = self.policy.encode(image)
+            self._cache.put(digest, payload, len(payload[0]))
+        return File.from_content(payload[0], extension=payload[1])
+
+    def _is_repeated(self, tag, digests, series):
+        digest = digests[0] if len(digests) == 1 else content_digest(*digests)
+        with self._lock:
+            repeated = self._last_digests.get(tag) == digest
+            self._last_digests[tag] = digest
+        if not series:
+            return repeated
+
+        return self._cache.add(content_digest(self._scope, tag.encode(), digest))
+
+
+def image_as_batch(image, dataformats="CHW"):
+    """Views a single CHW, HWC, HW or WH image as a batch of one, without copying it.
+
+    Returns the batch and its dataformats, as expected by `ImageConverter.convert`.
+    """
+    image = _as_numpy(image)
+    if dataformats == "CHW":
+        return image[np.newaxis], "NCHW"
+    if dataformats == "WH":
+        return image.T[np.newaxis, :, :, np.newaxis], "NHWC"
+    if dataformats == "HW":
+        return image[np.newaxis, :, :, np.newaxis], "NHWC"
+    return image[np.newaxis], "NHWC"
+
+
+def to_uint8_batch(images, dataformats="NHWC"):
+    """Converts a batch of images to a contiguous NHWC uint8 array in one vectorized pass.
+
+    Like `File.as_image`, every image with values in [0, 1] is scaled to [0, 255].
+    The images are read in place, so the returned array is the only copy made.
+    """
+    images = _as_numpy(images)
+    if images.ndim != 4:
+        # user facing
+        raise ValueError(f"neptune-tensorboard: Expected a batch of images with 4 dimensions, got {images.ndim}.")
+    if dataformats == "NCHW":
+        images = images.transpose(0, 2, 3, 1)
+    elif dataformats != "NHWC":
+        # user facing
+        raise ValueError(f"neptune-tensorboard: Unsupported dataformats {dataformats}, expected NCHW or NHWC.")
+
+    if images.dtype == np.uint8 or len(images) == 0:
+        return np.ascontiguousarray(images, dtype=np.uint8)
+
+    minimums, maximums = images.min(axis=(1, 2, 3)), images.max(axis=(1, 2, 3))
+    in_unit_range = (minimums >= 0) & (maximums <= 1)
+    in_range = np.all(in_unit_range | ((minimums >= 0) & (maximums <= 255)))
+    if not in_range:
+        # user facing
+        warnings.warn(
+            "neptune-tensorboard: Image data is outside of the [0, 1] and [0, 255] ranges, "
+            "so the colors won't be shown correctly."
+        )
+
+    scale = np.where(in_unit_range, 255, 1).astype(np.float32)[:, None, None, None]
+    batch = np.empty(images.shape, dtype=np.uint8)
+    if in_range:
+        # Scaled and cast element by element, straight into the contiguous batch.
+        np.multiply(images, scale, out=batch, dtype=np.float32, casting="unsafe")
+    else:
+        np.copyto(batch, np.clip(np.multiply(images, scale, dtype=np.float32), 0, 255), casting="unsafe")
+    return batch
+
+
+def make_grid(images, padding=2):
+    """Tiles a NHWC batch into a single HWC mosaic with `ceil(sqrt(N))` columns."""
+    n, height, width, channels = images.shape
+    columns = math.ceil(math.sqrt(n))
+    rows = math.ceil(n / columns)
+
+    grid = np.zeros(
+        (rows * (height + padding) + padding, columns * (width + padding) + padding, channels), dtype=images.dtype
+    )
+    for index, image in enumerate(images):
+        top = padding + (index // columns) * (height + padding)
+        left = padding + (index % columns) * (width + padding)
+        grid[top : top + height, left : left + width] = image
+    return grid
+
+
+def encode_images(images, policy):
+    """Encodes HWC uint8 images on a shared thread pool, returning their contents and extensions in order.
+
+    The encoders release the GIL while compressing, so the images of a batch are encoded in parallel.
+    """
+    encode = partial(_encode, policy=policy)
+    if len(images) == 1:
+        return [encode(images[0])]
+    return list(_get_encoding_pool().map(encode, images))
+
+
+def _encode(image, policy):
+    if image.shape[2] == 1:
+        image = image[:, :, 0]
+    return policy.encode(Image.fromarray(image))
+
+
+def _as_numpy(images):
+    # torch.Tensor and tf.Tensor, checked by duck typing so neither has to be imported
+    if hasattr(images, "detach"):
+        images = images.detach().cpu().numpy()
+    elif hasattr(images, "numpy"):
+        images = images.numpy()
+    return np.asarray(images)
+
+
+def _as_slice(indices):
+    """A slice selecting the sorted `indices`, so that they can be selected without copying if evenly spaced."""
+    step = indices[1] - indices[0] if len(indices) > 1 else 1
+    if indices == list(range(indices[0], indices[-1] + 1, step)):
+        return slice(indices[0], indices[-1] + 1, step)
+    return indices
+
+
+def _get_encoding_pool():
+    global _encoding_pool
+
+    with _encoding_pool_lock:
+        if _encoding_pool is None:
+            _encoding_pool = ThreadPoolExecutor(
+                max_workers=ENCODING_WORKERS, thread_name_prefix="neptune-tensorboard-images"
+            )
+        return _encoding_pool
@@ -0,0 +1,98 @@
+__all__ = ["when_imported"]
+
+import sys
+import threading
+import warnings
+from functools import partial
+from importlib.util import find_spec
+
+
+class _HookedLoader:
+    """Wraps the loader of a module to call the import hooks once the module was executed."""
+
+    def __init__(self, loader, on_import):
+        self._loader = loader
+        self._on_import = on_import
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        # NOTE: The module only ever sees its own loader, e.g. for importlib.resources.
+        module.__loader__ = module.__spec__.loader = self._loader
+        self._loader.exec_module(module)
+        self._on_import(module)
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class _ImportHooks:
+    """Finder of `sys.meta_path` calling hooks once a top-level module has finished importing.
+
+    It doesn't find any module itself: the spec found by the other finders is returned with a wrapped loader.
+    """
+
+    def __init__(self):
+        self._hooks = {}
+        self._finding = set()
+        self._lock = threading.RLock()
+
+    def register(self, name, hook):
+        with self._lock:
+            if name not in sys.modules:
+                self._hooks.setdefault(name, []).append(hook)
+                if self not in sys.meta_path:
+                    sys.meta_path.insert(0, self)
+                return partial(self._cancel, name, hook)
+
+        hook()
+        return lambda: None
+
+    def find_spec(self, fullname, path=None, target=None):
+        with self._lock:
+            if fullname not in self._hooks or fullname in self._finding:
+                return None
+            self._finding.add(fullname)
+
+        try:
+            spec = find_spec(fullname)
+        finally:
+            with self._lock:
+                self._finding.discard(fullname)
+
+        if spec is None or spec.loader is None or not hasattr(spec.loader, "exec_module"):
+            return spec
+        spec.loader = _HookedLoader(spec.loader, self._on_import)
+        return spec
+
+    def _on_import(self, module):
+        with self._lock:
+            hooks = self._hooks.pop(module.__name__, [])
+
+        for hook in hooks:
+            try:
+                hook()
+            except Exception as e:
+                # user facing
+                warnings.warn(f"neptune-tensorboard: Enabling the logging for {module.__name__} failed: {e}")
+
+    def _cancel(self, name, hook):
+        with self._lock:
+            hooks = self._hooks.get(name, [])
+            if hook in hooks:
+                hooks.remove(hook)
+            if not hooks:
+                self._hooks.pop(name, None)
+
+
+_import_hooks = _ImportHooks()
+
+
+def when_imported(name, hook):
+    """Calls `hook()` once the top-level module `name` is imported, or right away if it already is.
+
+    Errors raised by a deferred hook are reported as warnings, so they don't break the import.
+    Returns a function which cancels the hook if it wasn't called yet.
+    """
+    return _import_hooks.register(name, hook)
@@ -0,0 +1,118 @@
+__all__ = ["HookMetrics"]
+
+import bisect
+import threading
+import time
+
+MONITORING_NAMESPACE = "monitoring/neptune_tensorboard"
+# How often the metrics are reported to the run, in seconds.
+METRICS_REPORT_INTERVAL = 60.0
+# Upper bounds of the buckets of the latency histograms, in microseconds.
+LATENCY_BUCKETS_US = (10, 100, 1_000, 10_000, 100_000, 1_000_000)
+
+
+class _MethodMetrics:
+    __slots__ = ("calls", "hook_seconds", "original_seconds", "bytes_converted", "histogram")
+
+    def __init__(self):
+        self.calls = 0
+        self.hook_seconds = 0.0
+        self.original_seconds = 0.0
+        self.bytes_converted = 0
+        self.histogram = [0] * (len(LATENCY_BUCKETS_US) + 1)
+
+
+class HookMetrics:
+    """Measures how much time the hooks of a framework cost the training loop.
+
+    For every hooked method, it counts the calls and records a histogram of the time
+    spent in the hook (for asynchronous hooks, the time it takes to queue the call), the
+    time spent in the original method and how many bytes of images were converted.
+    The metrics are reported to `monitoring/neptune_tensorboard/<framework>` every
+    `report_interval` seconds and on `report()`.
+    """
+
+    def __init__(self, run, framework, dispatcher=None, report_interval=METRICS_REPORT_INTERVAL):
+        self._run = run
+        self._namespace = f"{MONITORING_NAMESPACE}/{framework}"
+        self._framework = framework
+        self._dispatcher = dispatcher
+        self._report_interval = report_interval
+        self._methods = {}
+        self._lock = threading.Lock()
+        self._last_report = time.monotonic()
+
+    def record(self, method, hook_seconds, original_seconds):
+        with self._lock:
+            metrics = self._get(method)
+            metrics.calls += 1
+            metrics.hook_seconds += hook_seconds
+            metrics.original_seconds += original_seconds
+            metrics.histogram[bisect.bisect_left(LATENCY_BUCKETS_US, hook_seconds * 1e6)] += 1
+            should_report = time.monotonic() - self._last_report >= self._report_interval
+
+        if should_report:
+            self.report()
+
+    def add_converted(self, method, files):
+        """Counts the bytes of the `File`s a hook converted."""
+        size = sum(len(file.content) for file in files)
+        with self._lock:
+            self._get(method).bytes_converted += size
+
+    def report(self):
+        with self._lock:
+            self._last_report = time.monotonic()
+            snapshot = {method: self._as_dict(metrics) for method, metrics in self._methods.items()}
+
+        namespace = self._run[self._namespace]
+        for method, values in snapshot.items():
+            for name, value in values.items():
+                if name == "latency_histogram":
+                    namespace[method][name] = value
+                else:
+                    namespace[method][name].append(value)
+        if self._dispatcher is not None:
+            queued, dropped = self._dispatcher.stats()
+            namespace["queue/pending_calls"].append(queued)
+            namespace["queue/dropped_calls"].append(dropped)
+
+    def print_summary(self):
+        if self._methods:
+            # user facing
+            print(self.summary())
+
+    def summary(self):
+        """Returns a table with the cost of each hooked method, the most expensive first."""
+        with self._lock:
+            methods = sorted(self._methods.items(), key=lambda item: item[1].hook_seconds, reverse=True)
+            columns = ("calls", "hook ms", "hook ms/call", "original ms", "MB converted")
+            lines = [
+                f"neptune-tensorboard: Time spent in the {self._framework} hooks",
+                f"{'method':<24}" + "".join(f"{column:>14}" for column in columns),
+            ]
+            for method, metrics in methods:
+                lines.append(
+                    f"{method:<24}{metrics.calls:>14}{metrics.hook_seconds * 1e3:>14.1f}"
+                    f"{metrics.hook_seconds * 1e3 / max(metrics.calls, 1):>14.3f}"
+                    f"{metrics.original_seconds * 1e3:>14.1f}{metrics.bytes_converted / 1e6:>14.2f}"
+                )
+        return "\n".join(lines)
+
+    def _get(self, method):
+        metrics = self._methods.get(method)
+        if metrics is None:
+            metrics = self._methods[method] = _MethodMetrics()
+        return metrics
+
+    @staticmethod
+    def _as_dict(metrics):
+        calls = max(metrics.calls, 1)
+        bounds = [f"le_{bound}us" for bound in LATENCY_BUCKETS_US] + ["inf"]
+        return {
+            "calls": metrics.calls,
+            "hook_ms_per_call": metrics.hook_seconds * 1e3 / calls,
+            "original_ms_per_call": metrics.original_seconds * 1e3 / calls,
+            "bytes_converted": metrics.bytes_converted,
+            "latency_histogram": dict(zip(bounds, metrics.histogram)),
+        }
@@ -0,0 +1,114 @@
+__all__ = ["SamplingRule", "TagSampler"]
+
+import math
+import threading
+import time
+from fnmatch import fnmatchcase
+
+
+class SamplingRule:
+    """Limits how often the values of the matching tags are mirrored to Neptune.
+
+    The local TensorBoard files still receive every value.
+
+    Args:
+        pattern: Glob pattern of the tags the rule applies to, e.g. "grad_norm/*".
+        every_n: Only every n-th value of a tag is mirrored.
+        min_interval: Minimum number of seconds between two mirrored values of a tag.
+        aggregate: Whether to also log the minimum, maximum and mean of the scalars logged since the previous
+            mirrored value, under `scalar_window/<tag>/{min,max,mean}`, so that skipped values aren't lost.
+
+    Example:
+        >>> from neptune_tensorboard import SamplingRule, enable_tensorboard_logging
+        >>> rules = [SamplingRule("layer_*/grad_norm", every_n=100, aggregate=True), SamplingRule(min_interval=1.0)]
+        >>> enable_tensorboard_logging(run, sampling=rules)
+    """
+
+    def __init__(self, pattern="*", every_n=1, min_interval=0.0, aggregate=False):
+        if every_n < 1:
+            # user facing
+            raise ValueError(f"neptune-tensorboard: `every_n` must be a positive integer, got {every_n}.")
+        if min_interval < 0:
+            # user facing
+            raise ValueError(f"neptune-tensorboard: `min_interval` can't be negative, got {min_interval}.")
+
+        self.pattern = pattern
+        self.every_n = every_n
+        self.min_interval = min_interval
+        self.aggregate = aggregate
+
+
+class _Window:
+    __slots__ = ("seen", "last_kept", "count", "minimum", "maximum", "total", "step", "timestamp")
+
+    def __init__(self):
+        self.seen = 0
+        self.last_kept = None
+        self.reset()
+
+    def reset(self):
+        self.count, self.minimum, self.maximum, self.total = 0, math.inf, -math.inf, 0.0
+
+    def add(self, value, step, timestamp):
+        self.count += 1
+        self.minimum, self.maximum = min(self.minimum, value), max(self.maximum, value)
+        self.total += value
+        self.step, self.timestamp = step, timestamp
+
+    def pop_aggregates(self):
+        aggregates = {"min": self.minimum, "max": self.maximum, "mean": self.total / self.count}
+        self.reset()
+        return aggregates
+
+
+class TagSampler:
+    """Applies the first matching `SamplingRule` to every logged value. Tags no rule matches are all kept."""
+
+    def __init__(self, rules):
+        self._rules = list(rules)
+        self._tag_rules = {}
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def sample(self, kind, tag, value=None, step=None, timestamp=None):
+        """Returns None if the value should be skipped, otherwise the aggregates of its window (possibly empty)."""
+        rule = self._rule_for(tag)
+        if rule is None:
+            return {}
+
+        with self._lock:
+            window = self._windows.get((kind, tag))
+            if window is None:
+                window = self._windows[(kind, tag)] = _Window()
+
+            index = window.seen
+            window.seen += 1
+            if rule.aggregate and value is not None:
+                try:
+                    window.add(float(value), step, timestamp)
+                except (TypeError, ValueError):
+                    pass
+
+            now = time.monotonic()
+            if index % rule.every_n or (window.last_kept is not None and now - window.last_kept < rule.min_interval):
+                return None
+
+            window.last_kept = now
+            return window.pop_aggregates() if window.count else {}
+
+    def drain(self, kind):
+        """Returns (tag, aggregates, step, timestamp) for the values of `kind` skipped since the last kept one."""
+        with self._lock:
+            return [
+                (tag, window.pop_aggregates(), window.step, window.timestamp)
+                for (window_kind, tag), window in self._windows.items()
+                if window_kind == kind and window.count
+            ]
+
+    def _rule_for(self, tag):
+        try:
+            return self._tag_rules[tag]
+        except KeyError:
+            rule = next((rule for rule in self._rules if fnmatchcase(tag, rule.pattern)), None)
+            self._tag_rules[tag] = rule
+            return rule
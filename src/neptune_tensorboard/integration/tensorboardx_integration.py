@@ -2,30 +2,43 @@ import contextlib
 import warnings
 from functools import partial
 
-import torch
 from neptune.types import File
 from neptune.utils import stringify_unsupported
-from tensorboardX.writer import SummaryWriter
-
-from neptune_tensorboard.integration.utils import register_pre_hook
-
-IS_TORCHVIZ_AVAILABLE = True
-try:
-    import torchviz
-except ImportError:
-    IS_TORCHVIZ_AVAILABLE = False
+from tensorboardX.writer import (
+    FileWriter,
+    SummaryWriter,
+)
+
+from neptune_tensorboard.integration.graphs import (
+    IS_GRAPHVIZ_AVAILABLE,
+    GraphRenderer,
+    graph_def_digraph,
+    graph_def_signature,
+)
+from neptune_tensorboard.integration.images import (
+    ImageConverter,
+    image_as_batch,
+)
+from neptune_tensorboard.integration.instrumentation import HookMetrics
+from neptune_tensorboard.integration.sampling import TagSampler
+from neptune_tensorboard.integration.utils import (
+    HandlerCache,
+    ScalarBuffer,
+    content_digest,
+    register_pre_hook,
+)
 
 __all__ = ["patch_tensorboardx", "NeptuneTensorboardXTracker"]
 
 _integrated_with_tensorboardx = False
 
 
-def patch_tensorboardx(run, base_namespace):
+def patch_tensorboardx(run, base_namespace, **options):
     global _integrated_with_tensorboardx
 
     if not _integrated_with_tensorboardx:
-        NeptuneTensorboardXTracker(run, base_namespace)
         _integrated_with_tensorboardx = True
+        return NeptuneTensorboardXTracker(run, base_namespace, **options)
 
 
 def track_scalar(
@@ -38,123 +51,217 @@ def track_scalar(
     summary_description="",
     run=None,
     base_namespace=None,
+    handlers=None,
+    scalar_buffer=None,
+    logged_at=None,
 ):
-    run[base_namespace]["scalar"][tag].append(scalar_value)
+    scalar_buffer.append(tag, scalar_value, global_step, walltime or logged_at)
 
 
 def track_image(
-    summary_writer, tag, img_tensor, global_step=None, walltime=None, dataformats="CHW", run=None, base_namespace=None
+    summary_writer,
+    tag,
+    img_tensor,
+    global_step=None,
+    walltime=None,
+    dataformats="CHW",
+    run=None,
+    base_namespace=None,
+    handlers=None,
+    logged_at=None,
+    image_converter=None,
+    hook_metrics=None,
 ):
-    if not isinstance(img_tensor, torch.Tensor):
-        img_tensor = torch.tensor(img_tensor)
     # dataformats : CHW, HWC, HW, WH
-    if dataformats == "CHW":
-        # convert to HWC
-        img_tensor = img_tensor.movedim(0, 2)
-    elif dataformats == "WH":
-        # convert to HW1
-        img_tensor = img_tensor.movedim(0, 1).unsqueeze(2)
-    elif dataformats == "HW":
-        # convert to HW1
-        img_tensor = img_tensor.unsqueeze(2)
-
-    run[base_namespace]["image"][tag] = File.as_image(img_tensor)
+    images = image_converter.convert(tag, *image_as_batch(img_tensor, dataformats), series=False)
+    if hook_metrics is not None:
+        hook_metrics.add_converted("add_image", images)
+    for image in images:
+        handlers.get("image", tag).assign(image)
 
 
 def track_images(
-    summary_writer, tag, img_tensor, global_step=None, walltime=None, dataformats="NCHW", run=None, base_namespace=None
+    summary_writer,
+    tag,
+    img_tensor,
+    global_step=None,
+    walltime=None,
+    dataformats="NCHW",
+    run=None,
+    base_namespace=None,
+    handlers=None,
+    logged_at=None,
+    image_converter=None,
+    hook_metrics=None,
 ):
-    if not isinstance(img_tensor, torch.Tensor):
-        img_tensor = torch.tensor(img_tensor)
-    # dataformats : CHW, HWC, HW, WH
-    if dataformats == "NCHW":
-        # convert to HWC
-        img_tensor = img_tensor.movedim(1, 3)
-    elif dataformats == "NHWC":
-        pass
-    else:
+    if dataformats not in ("NCHW", "NHWC"):
         # user facing
-        warnings.warn("neptune-tensorboard: Skipping logging images as  {dataformats} is not supported.")
+        warnings.warn(f"neptune-tensorboard: Skipping logging images as {dataformats} is not supported.")
+        return
 
-    for idx in range(img_tensor.shape[0]):
-        run[base_namespace]["images"][tag].append(File.as_image(img_tensor[idx]))
+    images = image_converter.convert(tag, img_tensor, dataformats)
+    if hook_metrics is not None:
+        hook_metrics.add_converted("add_images", images)
+    handlers.extend("images", tag, images, step=global_step, timestamp=walltime or logged_at)
 
 
 def track_figure(
-    summary_writer, tag, figure, global_step=None, close=True, walltime=None, run=None, base_namespace=None
+    summary_writer,
+    tag,
+    figure,
+    global_step=None,
+    close=True,
+    walltime=None,
+    run=None,
+    base_namespace=None,
+    handlers=None,
+    logged_at=None,
+    hook_metrics=None,
 ):
-    run[base_namespace]["figure"][tag].append(figure)
+    # NOTE: The figure is rendered here, so that a repeated one isn't uploaded again.
+    image = File.as_image(figure)
+    if hook_metrics is not None:
+        hook_metrics.add_converted("add_figure", [image])
+    if not handlers.is_repeated("figure", tag, content_digest(image.content)):
+        handlers.append("figure", tag, image, step=global_step, timestamp=walltime or logged_at)
 
 
-def track_text(summary_writer, tag, text_string, global_step=None, walltime=None, run=None, base_namespace=None):
-    run[base_namespace]["text"][tag].append(text_string)
+def track_text(
+    summary_writer,
+    tag,
+    text_string,
+    global_step=None,
+    walltime=None,
+    run=None,
+    base_namespace=None,
+    handlers=None,
+    logged_at=None,
+    sampler=None,
+):
+    if sampler is not None and sampler.sample("text", tag) is None:
+        return
+    handlers.append("text", tag, text_string, step=global_step, timestamp=walltime or logged_at)
 
 
 def track_graph(
-    summary_writer, model, input_to_model=None, verbose=False, use_strict_trace=True, run=None, base_namespace=None
+    file_writer,
+    graph_profile,
+    walltime=None,
+    run=None,
+    base_namespace=None,
+    handlers=None,
+    logged_at=None,
+    graph_renderer=None,
 ):
-    if not IS_TORCHVIZ_AVAILABLE:
+    # NOTE: The hook receives the graph traced by `SummaryWriter.add_graph()`,
+    #       so that the model doesn't run an extra forward pass to be visualized.
+    if not IS_GRAPHVIZ_AVAILABLE:
         # user facing
-        msg = "neptune-tensorboard: Skipping model visualization because no torchviz installation was found."
+        msg = "neptune-tensorboard: Skipping model visualization because no graphviz installation was found."
         warnings.warn(msg)
         return
-    if input_to_model is None:
-        # user facing
-        msg = "neptune-tensorboard: Skipping model visualization because input_to_model was None."
-        warnings.warn(msg)
-        return
-    output = model(input_to_model)
-    graph = torchviz.make_dot(output, params=dict(model.named_parameters()))
-    png_bytes = graph.pipe(format="png")
-    run[base_namespace]["graph"].upload(File.from_content(png_bytes, extension="png"))
+    graph_def = graph_profile[0]
+    signature = graph_def_signature(graph_def)
+    if graph_renderer.is_new(signature):
+        graph_renderer.upload(handlers, graph_def_digraph(graph_def), signature)
 
 
 def track_hparam(
-    summary_writer, hparam_dict, metric_dict, hparam_domain_discrete=None, run_name=None, run=None, base_namespace=None
+    summary_writer,
+    hparam_dict,
+    metric_dict,
+    hparam_domain_discrete=None,
+    run_name=None,
+    run=None,
+    base_namespace=None,
+    handlers=None,
+    logged_at=None,
 ):
-    run[base_namespace]["hparams"] = stringify_unsupported(hparam_dict)
-    run[base_namespace]["metrics"] = stringify_unsupported(metric_dict)
+    handlers.get("hparams").assign(stringify_unsupported(hparam_dict))
+    handlers.get("metrics").assign(stringify_unsupported(metric_dict))
 
 
 class NeptuneTensorboardXTracker(contextlib.AbstractContextManager):
-    def __init__(self, run, base_namespace):
+    def __init__(
+        self,
+        run,
+        base_namespace,
+        dispatcher=None,
+        image_grid=False,
+        image_policy=None,
+        graph_format="png",
+        instrument=False,
+        sampling=None,
+    ):
         self.org_add_scalar = SummaryWriter.add_scalar
         self.org_add_image = SummaryWriter.add_image
         self.org_add_images = SummaryWriter.add_images
         self.org_add_figure = SummaryWriter.add_figure
         self.org_add_text = SummaryWriter.add_text
-        self.org_add_graph = SummaryWriter.add_graph
+        self.org_add_graph = FileWriter.add_graph
         self.org_add_hparams = SummaryWriter.add_hparams
 
-        register_pre_hook_with_run = partial(register_pre_hook, run=run, base_namespace=base_namespace)
+        self._handlers = HandlerCache(run[base_namespace])
+        self._sampler = TagSampler(sampling) if sampling else None
+        self._scalar_buffer = ScalarBuffer(self._handlers, sampler=self._sampler)
+        self._image_converter = ImageConverter(image_policy, grid=image_grid)
+        self._graph_renderer = GraphRenderer(graph_format)
+        self._metrics = HookMetrics(run, "tensorboardx", dispatcher) if instrument else None
 
-        SummaryWriter.add_scalar = register_pre_hook_with_run(
-            original=SummaryWriter.add_scalar, neptune_hook=track_scalar
+        register_pre_hook_with_run = partial(
+            register_pre_hook, run=run, base_namespace=base_namespace, handlers=self._handlers, metrics=self._metrics
         )
+        # NOTE: Figures are converted on the training thread, as matplotlib isn't safe to use from another thread.
+        register_async_pre_hook_with_run = partial(register_pre_hook_with_run, dispatcher=dispatcher)
 
-        SummaryWriter.add_image = register_pre_hook_with_run(original=SummaryWriter.add_image, neptune_hook=track_image)
+        SummaryWriter.add_scalar = register_async_pre_hook_with_run(
+            original=SummaryWriter.add_scalar, neptune_hook=track_scalar, scalar_buffer=self._scalar_buffer
+        )
 
-        SummaryWriter.add_images = register_pre_hook_with_run(
-            original=SummaryWriter.add_images, neptune_hook=track_images
+        SummaryWriter.add_image = register_async_pre_hook_with_run(
+            original=SummaryWriter.add_image,
+            neptune_hook=track_image,
+            image_converter=self._image_converter,
+            hook_metrics=self._metrics,
+        )
+
+        SummaryWriter.add_images = register_async_pre_hook_with_run(
+            original=SummaryWriter.add_images,
+            neptune_hook=track_images,
+            image_converter=self._image_converter,
+            hook_metrics=self._metrics,
         )
 
         SummaryWriter.add_figure = register_pre_hook_with_run(
-            original=SummaryWriter.add_figure, neptune_hook=track_figure
+            original=SummaryWriter.add_figure, neptune_hook=track_figure, hook_metrics=self._metrics
         )
 
-        SummaryWriter.add_text = register_pre_hook_with_run(original=SummaryWriter.add_text, neptune_hook=track_text)
+        SummaryWriter.add_text = register_async_pre_hook_with_run(
+            original=SummaryWriter.add_text, neptune_hook=track_text, sampler=self._sampler
+        )
 
-        SummaryWriter.add_graph = register_pre_hook_with_run(original=SummaryWriter.add_graph, neptune_hook=track_graph)
+        FileWriter.add_graph = register_async_pre_hook_with_run(
+            original=FileWriter.add_graph, neptune_hook=track_graph, graph_renderer=self._graph_renderer
+        )
 
-        SummaryWriter.add_hparams = register_pre_hook_with_run(
+        SummaryWriter.add_hparams = register_async_pre_hook_with_run(
             original=SummaryWriter.add_hparams, neptune_hook=track_hparam
         )
 
+    def flush(self):
+        self._scalar_buffer.flush()
+        self._graph_renderer.flush()
+        if self._metrics is not None:
+            self._metrics.report()
+
     def __exit__(self, exc_type, exc_value, traceback):
         SummaryWriter.add_scalar = self.org_add_scalar
         SummaryWriter.add_image = self.org_add_image
         SummaryWriter.add_images = self.org_add_images
         SummaryWriter.add_figure = self.org_add_figure
         SummaryWriter.add_text = self.org_add_text
-        SummaryWriter.add_graph = self.org_add_graph
+        FileWriter.add_graph = self.org_add_graph
         SummaryWriter.add_hparams = self.org_add_hparams
+        self.flush()
+        if self._metrics is not None:
+            self._metrics.print_summary()
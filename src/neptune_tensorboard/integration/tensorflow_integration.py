@@ -15,12 +15,23 @@
 #
 import contextlib
 import warnings
+from functools import wraps
 from importlib.util import find_spec
 
 import tensorflow as tf
-from neptune.types import File
 
-from neptune_tensorboard.integration.utils import register_pre_hook
+from neptune_tensorboard.integration.graphs import (
+    GraphRenderer,
+    graph_def_signature,
+)
+from neptune_tensorboard.integration.images import ImageConverter
+from neptune_tensorboard.integration.instrumentation import HookMetrics
+from neptune_tensorboard.integration.sampling import TagSampler
+from neptune_tensorboard.integration.utils import (
+    HandlerCache,
+    ScalarBuffer,
+    register_pre_hook,
+)
 
 IS_GRAPHLIB_AVAILABLE = find_spec("tfgraphviz")
 if IS_GRAPHLIB_AVAILABLE:
@@ -31,68 +42,159 @@ _integrated_with_tensorflow = False
 __all__ = ["patch_tensorflow", "NeptuneTensorflowTracker"]
 
 
-def patch_tensorflow(run, base_namespace):
+def patch_tensorflow(run, base_namespace, **options):
     global _integrated_with_tensorflow
 
     if not _integrated_with_tensorflow:
-        NeptuneTensorflowTracker(run, base_namespace)
         _integrated_with_tensorflow = True
+        return NeptuneTensorflowTracker(run, base_namespace, **options)
 
 
-def track_scalar(name, data, run=None, base_namespace=None, **kwargs):
-    run[base_namespace]["scalar"][name].append(data)
+def with_default_step(summary_fn):
+    """Passes the default step of `tf.summary` explicitly, as it's only set for the thread that logs the summary."""
 
+    @wraps(summary_fn)
+    def wrapper(name, data, step=None, *args, **kwargs):
+        if step is None:
+            step = tf.summary.experimental.get_step()
+        return summary_fn(name, data, step, *args, **kwargs)
 
-def track_image(name, data, run=None, base_namespace=None, description=None, **kwargs):
+    return wrapper
+
+
+def track_scalar(
+    name, data, step=None, run=None, base_namespace=None, handlers=None, scalar_buffer=None, logged_at=None, **kwargs
+):
+    scalar_buffer.append(name, data, step, logged_at)
+
+
+def track_image(
+    name,
+    data,
+    step=None,
+    max_outputs=3,
+    description=None,
+    run=None,
+    base_namespace=None,
+    handlers=None,
+    logged_at=None,
+    image_converter=None,
+    hook_metrics=None,
+    **kwargs,
+):
     # If number of images (tf.shape(data)[0]) > 1, append images as FileSeries, else upload as an image.
     # ref: https://www.tensorflow.org/api_docs/python/tf/summary/image
     k = tf.shape(data)[0]
+    images = image_converter.convert(name, data, series=bool(k > 1))
+    if hook_metrics is not None:
+        hook_metrics.add_converted("image", images)
     if k > 1:
-        for num in range(k):
-            run[base_namespace]["image"][name].append(File.as_image(data[num]), description=description)
+        handlers.extend("image", name, images, step=step, timestamp=logged_at, description=description)
     else:
         if description:
             warnings.warn(f"neptune-tensorboard: Uploading single image ({name}). Description will be ignored.")
-        run[base_namespace]["image"][name] = File.as_image(data[0])
+        for image in images:
+            handlers.get("image", name).assign(image)
 
 
-def track_text(name, data, run=None, base_namespace=None, **kwargs):
-    run[base_namespace]["text"][name] = data
+def track_text(name, data, step=None, run=None, base_namespace=None, handlers=None, sampler=None, **kwargs):
+    if sampler is not None and sampler.sample("text", name) is None:
+        return
+    handlers.get("text", name).assign(data)
 
 
-def track_graph(graph_data, run=None, base_namespace=None):
+def track_graph(graph_data, run=None, base_namespace=None, handlers=None, logged_at=None, graph_renderer=None):
     if IS_GRAPHLIB_AVAILABLE:
-        graph = tfg.board(graph_data)
-        png_bytes = graph.pipe(format="png")
         # There is only one graph
-        run[base_namespace]["graph"].upload(File.from_content(png_bytes, extension="png"))
+        signature = graph_def_signature(graph_data)
+        if graph_renderer.is_new(signature):
+            graph_renderer.upload(handlers, tfg.board(graph_data), signature)
     else:
         # user facing
         warnings.warn("neptune-tensorboard: Skipping model visualization because no tfgraphviz installation was found.")
 
 
 class NeptuneTensorflowTracker(contextlib.AbstractContextManager):
-    def __init__(self, run, base_namespace):
+    def __init__(
+        self,
+        run,
+        base_namespace,
+        dispatcher=None,
+        image_grid=False,
+        image_policy=None,
+        graph_format="png",
+        instrument=False,
+        sampling=None,
+    ):
         self.org_scalar = tf.summary.scalar
         self.org_image = tf.summary.image
         self.org_text = tf.summary.text
         self.org_graph = tf.summary.graph
-
-        tf.summary.scalar = register_pre_hook(
-            original=tf.summary.scalar, neptune_hook=track_scalar, run=run, base_namespace=base_namespace
+        self._handlers = HandlerCache(run[base_namespace])
+        self._sampler = TagSampler(sampling) if sampling else None
+        self._scalar_buffer = ScalarBuffer(self._handlers, sampler=self._sampler)
+        self._image_converter = ImageConverter(image_policy, grid=image_grid)
+        self._graph_renderer = GraphRenderer(graph_format)
+        self._metrics = HookMetrics(run, "tensorflow", dispatcher) if instrument else None
+
+        tf.summary.scalar = with_default_step(
+            register_pre_hook(
+                original=tf.summary.scalar,
+                neptune_hook=track_scalar,
+                run=run,
+                base_namespace=base_namespace,
+                handlers=self._handlers,
+                metrics=self._metrics,
+                dispatcher=dispatcher,
+                scalar_buffer=self._scalar_buffer,
+            )
         )
-        tf.summary.image = register_pre_hook(
-            original=tf.summary.image, neptune_hook=track_image, run=run, base_namespace=base_namespace
+        tf.summary.image = with_default_step(
+            register_pre_hook(
+                original=tf.summary.image,
+                neptune_hook=track_image,
+                run=run,
+                base_namespace=base_namespace,
+                handlers=self._handlers,
+                metrics=self._metrics,
+                dispatcher=dispatcher,
+                image_converter=self._image_converter,
+                hook_metrics=self._metrics,
+            )
         )
-        tf.summary.text = register_pre_hook(
-            original=tf.summary.text, neptune_hook=track_text, run=run, base_namespace=base_namespace
+        tf.summary.text = with_default_step(
+            register_pre_hook(
+                original=tf.summary.text,
+                neptune_hook=track_text,
+                run=run,
+                base_namespace=base_namespace,
+                handlers=self._handlers,
+                metrics=self._metrics,
+                dispatcher=dispatcher,
+                sampler=self._sampler,
+            )
         )
         tf.summary.graph = register_pre_hook(
-            original=tf.summary.graph, neptune_hook=track_graph, run=run, base_namespace=base_namespace
+            original=tf.summary.graph,
+            neptune_hook=track_graph,
+            run=run,
+            base_namespace=base_namespace,
+            handlers=self._handlers,
+            metrics=self._metrics,
+            graph_renderer=self._graph_renderer,
         )
 
+    def flush(self):
+        self._scalar_buffer.flush()
+        self._graph_renderer.flush()
+        if self._metrics is not None:
+            self._metrics.report()
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         tf.summary.scalar = self.org_scalar
         tf.summary.image = self.org_image
         tf.summary.text = self.org_text
         tf.summary.graph = self.org_graph
+        self.flush()
+        if self._metrics is not None:
+            self._metrics.print_summary()
@@ -1,10 +1,550 @@
+import hashlib
+import math
+import threading
+import time
+import warnings
+from array import array
+from collections import (
+    OrderedDict,
+    deque,
+)
 from functools import wraps
 
+import numpy as np
 
-def register_pre_hook(original, neptune_hook, run, base_namespace):
+BACKPRESSURE_POLICIES = ("block", "drop_oldest", "sample")
+# How many bytes of encoded payloads are kept for reuse by a `ContentCache`.
+CONTENT_CACHE_BYTES = 64 * 1024 * 1024
+# Approximate memory taken by an entry of a `ContentCache` which only records an upload.
+UPLOAD_ENTRY_BYTES = 256
+# How many bytes of a `HandlerCache` remember the uploads of figures, i.e. tens of thousands of them.
+UPLOAD_HISTORY_BYTES = 16 * 1024 * 1024
+# How far apart the points of a series which repeat a step are placed, so that the steps logged after them catch up.
+REPEATED_STEP_INTERVAL = 0.5
+
+
+def register_pre_hook(original, neptune_hook, run, base_namespace, dispatcher=None, metrics=None, **hook_kwargs):
     @wraps(original)
     def wrapper(*args, **kwargs):
-        neptune_hook(*args, **kwargs, run=run, base_namespace=base_namespace)
-        return original(*args, **kwargs)
+        # NOTE: The hooks use `logged_at` as the timestamp when no walltime is passed,
+        #       so that the values logged asynchronously keep the time they were logged at.
+        logged_at = time.time()
+        start = time.perf_counter()
+        if dispatcher is None:
+            neptune_hook(*args, **kwargs, run=run, base_namespace=base_namespace, logged_at=logged_at, **hook_kwargs)
+        else:
+            copies = []
+            copied_args, copied_kwargs = snapshot(args, copies), snapshot(kwargs, copies)
+            dispatcher.submit(
+                _after_copies(neptune_hook, copies) if copies else neptune_hook,
+                copied_args,
+                {
+                    **copied_kwargs,
+                    "run": run,
+                    "base_namespace": base_namespace,
+                    "logged_at": logged_at,
+                    **hook_kwargs,
+                },
+            )
+        if metrics is None:
+            return original(*args, **kwargs)
+
+        hook_end = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            metrics.record(original.__name__, hook_end - start, time.perf_counter() - hook_end)
+
+    return wrapper
+
+
+def flush_before_sync(run, flush, close=None):
+    """Makes `run.wait()`, `run.sync()` and `run.stop()` first deliver the metadata held by the integration.
+
+    `close` replaces `flush` for `run.stop()`, which is also called on interpreter exit.
+    Returns a function which restores the original methods.
+    """
+    originals = {name: getattr(run, name) for name in ("wait", "sync", "stop")}
+
+    def flushing(original, flush):
+        @wraps(original)
+        def wrapper(*args, **kwargs):
+            flush()
+            return original(*args, **kwargs)
+
+        return wrapper
+
+    for name, original in originals.items():
+        setattr(run, name, flushing(original, close if name == "stop" and close else flush))
+
+    def restore():
+        for name, original in originals.items():
+            setattr(run, name, original)
+
+    return restore
+
+
+def snapshot(value, copies=None):
+    """Copies the mutable arguments of a hook, so the training loop can keep modifying the originals.
+
+    If a `copies` list is given, CUDA tensors are copied to pinned memory without waiting for the device,
+    and the CUDA events marking the end of the copies are added to it.
+    """
+    if isinstance(value, dict):
+        return {key: snapshot(item, copies) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(snapshot(item, copies) for item in value)
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    # torch.Tensor, checked by duck typing so torch doesn't have to be imported
+    if hasattr(value, "detach") and hasattr(value, "to"):
+        if copies is not None and getattr(value, "is_cuda", False):
+            return _copy_to_pinned_memory(value, copies)
+        return value.detach().to("cpu", copy=True)
+    # tf.Tensor and tf.Variable, e.g. the default step of `tf.summary`
+    if hasattr(value, "numpy"):
+        return value.numpy()
+    return value
+
+
+def _copy_to_pinned_memory(tensor, copies):
+    import torch
+
+    # NOTE: The pinned blocks are recycled by the caching host allocator of torch.
+    host = torch.empty(tensor.shape, dtype=tensor.dtype, pin_memory=True)
+    host.copy_(tensor.detach(), non_blocking=True)
+    event = torch.cuda.Event()
+    event.record()
+    copies.append(event)
+    return host
+
+
+def _after_copies(hook, copies):
+    """Makes `hook` wait for the copies from the device to complete first."""
+
+    @wraps(hook)
+    def wrapper(*args, **kwargs):
+        for event in copies:
+            event.synchronize()
+        return hook(*args, **kwargs)
 
     return wrapper
+
+
+class AsyncHookDispatcher:
+    """Runs Neptune hooks on a background thread, so that they don't stall the training loop.
+
+    At most `max_queue` calls are waiting at a time. Once the queue is full, `backpressure` decides what happens:
+        - "block": the training loop waits until there is room in the queue.
+        - "drop_oldest": the oldest waiting call is discarded.
+        - "sample": only every n-th call is kept (discarding the oldest waiting call), with n doubling for as long
+          as the queue stays full and resetting once it drains to half of its size.
+    """
+
+    def __init__(self, max_queue=1000, backpressure="block"):
+        if backpressure not in BACKPRESSURE_POLICIES:
+            # user facing
+            raise ValueError(
+                f"neptune-tensorboard: `backpressure` must be one of {BACKPRESSURE_POLICIES}, got {backpressure!r}."
+            )
+        if max_queue < 1:
+            # user facing
+            raise ValueError(f"neptune-tensorboard: `max_queue` must be a positive integer, got {max_queue}.")
+
+        self._max_queue = max_queue
+        self._backpressure = backpressure
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._in_progress = 0
+        self._closed = False
+        self._sample_every = 1
+        self._saturated_calls = 0
+        self._dropped = 0
+        # NOTE: The thread is only started once the first call is submitted, so that enabling
+        #       the logging for frameworks which are already patched doesn't leave one idle.
+        self._thread = None
+
+    def submit(self, hook, args, kwargs):
+        with self._condition:
+            if self._closed:
+                hook(*args, **kwargs)
+                return
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work, name="neptune-tensorboard-hooks", daemon=True)
+                self._thread.start()
+
+            if len(self._queue) >= self._max_queue:
+                if self._backpressure == "block":
+                    self._condition.wait_for(lambda: len(self._queue) < self._max_queue)
+                elif self._backpressure == "drop_oldest":
+                    self._drop_oldest()
+                else:
+                    self._saturated_calls += 1
+                    if self._saturated_calls % self._sample_every:
+                        self._dropped += 1
+                        return
+                    self._sample_every *= 2
+                    self._drop_oldest()
+
+            self._queue.append((hook, args, kwargs))
+            self._condition.notify_all()
+
+    def stats(self):
+        """Returns the number of calls waiting in the queue and of the calls dropped so far."""
+        with self._condition:
+            return len(self._queue), self._dropped
+
+    def flush(self):
+        """Waits until all the submitted calls were processed."""
+        with self._condition:
+            self._condition.wait_for(lambda: not self._queue and not self._in_progress)
+
+    def close(self):
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+        if self._dropped:
+            # user facing
+            warnings.warn(
+                f"neptune-tensorboard: {self._dropped} logging calls were dropped because the queue of pending "
+                f"calls was full. Consider increasing `max_queue`."
+            )
+
+    def _drop_oldest(self):
+        self._queue.popleft()
+        self._dropped += 1
+
+    def _work(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue or self._closed)
+                if not self._queue:
+                    return
+                hook, args, kwargs = self._queue.popleft()
+                self._in_progress += 1
+                if len(self._queue) <= self._max_queue // 2:
+                    self._sample_every, self._saturated_calls = 1, 0
+                self._condition.notify_all()
+
+            try:
+                hook(*args, **kwargs)
+            except Exception as e:
+                # user facing
+                warnings.warn(f"neptune-tensorboard: Logging with {hook.__name__} failed: {e}")
+            finally:
+                with self._condition:
+                    self._in_progress -= 1
+                    self._condition.notify_all()
+
+
+def content_digest(*buffers):
+    """Fast 128-bit digest of bytes-like objects, e.g. contiguous numpy arrays."""
+    digest = hashlib.blake2b(digest_size=16)
+    for buffer in buffers:
+        digest.update(buffer)
+    return digest.digest()
+
+
+class ContentCache:
+    """Size-bounded LRU cache of encoded payloads, keyed by the digest of their source.
+
+    The least recently used payloads are evicted once they take more than `max_bytes`.
+    """
+
+    def __init__(self, max_bytes=CONTENT_CACHE_BYTES):
+        self._max_bytes = max_bytes
+        self._size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            self._entries.move_to_end(digest)
+            return entry[0]
+
+    def put(self, digest, payload, size):
+        if size > self._max_bytes:
+            return
+        with self._lock:
+            self._put(digest, payload, size)
+
+    def add(self, digest):
+        """Records `digest` without a payload, e.g. for an upload, and returns whether it was recorded already."""
+        with self._lock:
+            if digest in self._entries:
+                self._entries.move_to_end(digest)
+                return True
+            self._put(digest, None, UPLOAD_ENTRY_BYTES)
+            return False
+
+    def _put(self, digest, payload, size):
+        previous = self._entries.pop(digest, None)
+        if previous is not None:
+            self._size -= previous[1]
+        self._entries[digest] = (payload, size)
+        self._size += size
+        while self._size > self._max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._size -= evicted_size
+
+
+class HandlerCache:
+    """Bounded LRU cache of the handlers of `namespace_handler[kind][tag]`.
+
+    Resolving a handler parses and joins its path on every call, which adds up
+    in hooks called at every step. The least recently used handlers are evicted
+    once `maxsize` of them are cached, so runs with many distinct tags stay bounded.
+    """
+
+    def __init__(self, namespace_handler, maxsize=1024):
+        self._namespace_handler = namespace_handler
+        self._maxsize = maxsize
+        self._handlers = OrderedDict()
+        self._series_steps = {}
+        self._last_digests = {}
+        self._uploads = ContentCache(max_bytes=UPLOAD_HISTORY_BYTES)
+        self._file_names = {}
+        self._lock = threading.Lock()
+
+    def get(self, kind, tag=None):
+        key = (kind, tag)
+        with self._lock:
+            handler = self._handlers.get(key)
+            if handler is not None:
+                self._handlers.move_to_end(key)
+                return handler
+
+            handler = self._namespace_handler[kind]
+            if tag is not None:
+                handler = handler[tag]
+            self._handlers[key] = handler
+            if len(self._handlers) > self._maxsize:
+                self._handlers.popitem(last=False)
+            return handler
+
+    def is_repeated(self, kind, tag, digest, series=True):
+        """Returns whether the content with this `digest` was already uploaded to `kind/tag`, and records it.
+
+        A series holds all the earlier uploads, as far back as they are remembered, while
+        any other attribute only holds the last one, so pass `series=False` for those.
+        """
+        with self._lock:
+            repeated = self._last_digests.get((kind, tag)) == digest
+            self._last_digests[(kind, tag)] = digest
+        if not series:
+            return repeated
+        return self._uploads.add(content_digest(f"{kind}/{tag}".encode(), digest))
+
+    def upload_unique(self, kind, tag, name, file):
+        """Uploads `file` to `namespace_handler[kind][tag][name]`, or to `name_<n>` if an earlier file took `name`."""
+        with self._lock:
+            names = self._file_names.setdefault((kind, tag), {})
+            uploaded = names.get(name, 0)
+            names[name] = uploaded + 1
+        self.get(kind, tag)[f"{name}_{uploaded}" if uploaded else name].upload(file)
+
+    def resolve_steps(self, kind, tag, steps):
+        """Returns the steps to send the next points of the series `namespace_handler[kind][tag]` with.
+
+        See `SeriesSteps.resolve()`.
+        """
+        with self._lock:
+            series_steps = self._series_steps.get((kind, tag))
+            if series_steps is None:
+                series_steps = self._series_steps[(kind, tag)] = SeriesSteps()
+            return series_steps.resolve(steps)
+
+    def state(self):
+        """Returns the last step of every series and the file names taken so far, as JSON-compatible data."""
+        with self._lock:
+            return {
+                "last_steps": [
+                    [kind, tag, steps.last_step]
+                    for (kind, tag), steps in self._series_steps.items()
+                    if steps.last_step is not None
+                ],
+                "file_names": [[kind, tag, dict(names)] for (kind, tag), names in self._file_names.items()],
+            }
+
+    def restore(self, state):
+        """Continues from a `state()`, e.g. saved by an earlier export to the same namespace.
+
+        The state is merged with the current one, keeping the highest steps and counts.
+        """
+        with self._lock:
+            for kind, tag, last_step in state.get("last_steps", []):
+                steps = self._series_steps.setdefault((kind, tag), SeriesSteps())
+                if steps.last_step is None or last_step > steps.last_step:
+                    steps.last_step = last_step
+            for kind, tag, restored_names in state.get("file_names", []):
+                names = self._file_names.setdefault((kind, tag), {})
+                for name, uploaded in restored_names.items():
+                    names[name] = max(names.get(name, 0), uploaded)
+
+    def append(self, kind, tag, value, step=None, timestamp=None, **kwargs):
+        """Appends `value` to the series `namespace_handler[kind][tag]` at the given step and timestamp."""
+        handler = self.get(kind, tag)
+        # NOTE: The points without a step are resolved as well, to keep track of the steps Neptune assigns them.
+        steps = self.resolve_steps(kind, tag, [None if step is None else float(step)])
+        step = None if steps is None else steps[0]
+        handler.append(value, step=step, timestamp=timestamp, **kwargs)
+
+    def extend(self, kind, tag, values, step=None, timestamp=None, **kwargs):
+        """Appends the values logged by a single call, e.g. a batch of images, to `namespace_handler[kind][tag]`.
+
+        TensorBoard logs them all at the same step, so they are spread over `[step, step + 1)`
+        to give each value a step of its own.
+        """
+        if not values:
+            return
+        handler = self.get(kind, tag)
+        steps = [None] * len(values)
+        if step is not None:
+            steps = [float(step) + index / len(values) for index in range(len(values))]
+        steps = self.resolve_steps(kind, tag, steps)
+        timestamps = None if timestamp is None else [timestamp] * len(values)
+        handler.extend(values, steps=steps, timestamps=timestamps, **kwargs)
+
+
+class SeriesSteps:
+    """Keeps the steps sent to a Neptune series strictly increasing.
+
+    Neptune rejects points whose step isn't greater than the last one of their series, while
+    TensorBoard repeats steps, e.g. when `global_step` isn't passed or training restarts. The steps
+    are resolved point by point: every step greater than the previous one is kept as it is, while the
+    points repeating a step, or logged without one, are placed half a step after the previous point, or
+    spread evenly up to the next kept step when there isn't room for that. Since the steps logged afterwards
+    grow faster, they are soon kept again, instead of all being moved after the repeated ones.
+    """
+
+    __slots__ = ("last_step",)
+
+    def __init__(self):
+        self.last_step = None
+
+    def resolve(self, steps):
+        """Returns the steps to send the next points with, or None if Neptune has to assign them.
+
+        `steps` holds a step for each point, None or NaN if the point was logged without one.
+        """
+        if not steps:
+            return steps
+        if not any(_has_step(step) for step in steps):
+            # NOTE: Neptune assigns `last step + 1` to the points without a step, starting from 0.
+            self.last_step = (-1 if self.last_step is None else self.last_step) + len(steps)
+            return None
+
+        resolved, skipped = [], 0
+        for step in steps:
+            if _has_step(step) and (self.last_step is None or step > self.last_step):
+                resolved.extend(self._follow_last(skipped, until=step))
+                resolved.append(step)
+                self.last_step, skipped = step, 0
+            else:
+                skipped += 1
+        resolved.extend(self._follow_last(skipped, until=math.inf))
+        self.last_step = resolved[-1]
+        return resolved
+
+    def _follow_last(self, count, until):
+        """Returns `count` steps between the last step and `until`, `REPEATED_STEP_INTERVAL` apart if they fit."""
+        if self.last_step is None:
+            last = min(-REPEATED_STEP_INTERVAL, until - (count + 1) * REPEATED_STEP_INTERVAL)
+        else:
+            last = self.last_step
+        if last + count * REPEATED_STEP_INTERVAL < until:
+            return [last + index * REPEATED_STEP_INTERVAL for index in range(1, count + 1)]
+        return [last + (until - last) * index / (count + 1) for index in range(1, count + 1)]
+
+
+def _has_step(step):
+    return step is not None and not math.isnan(step)
+
+
+class _BufferedSeries:
+    __slots__ = ("values", "steps", "timestamps", "series_steps")
+
+    def __init__(self):
+        self.values, self.steps, self.timestamps = array("d"), array("d"), array("d")
+        self.series_steps = SeriesSteps()
+
+
+class ScalarBuffer:
+    """Coalesces the scalars logged by the hooks and uploads them with one `extend` per tag and batch.
+
+    Logging a scalar only appends it to compact per-tag arrays. The buffered points are
+    uploaded once a tag collects `flush_size` of them, once `flush_interval` seconds
+    passed since the previous upload, and on `flush()`. The scalars logged without a step
+    keep the steps of the others in their batch, see `SeriesSteps`.
+    """
+
+    def __init__(self, handlers, flush_size=1000, flush_interval=1.0, sampler=None):
+        self._handlers = handlers
+        self._flush_size = flush_size
+        self._flush_interval = flush_interval
+        self._sampler = sampler
+        self._series = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def append(self, tag, value, step=None, timestamp=None):
+        if self._sampler is not None:
+            aggregates = self._sampler.sample("scalar", tag, value, step, timestamp)
+            if aggregates is None:
+                return
+            self._append_aggregates(tag, aggregates, step, timestamp)
+        self._append("scalar", tag, value, step, timestamp)
+
+    def flush(self):
+        if self._sampler is not None:
+            for tag, aggregates, step, timestamp in self._sampler.drain("scalar"):
+                self._append_aggregates(tag, aggregates, step, timestamp)
+        with self._lock:
+            self._flush_all()
+
+    def _append_aggregates(self, tag, aggregates, step, timestamp):
+        for name, value in aggregates.items():
+            self._append("scalar_window", f"{tag}/{name}", value, step, timestamp)
+
+    def _append(self, kind, tag, value, step, timestamp):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            # Not a number, so there is nothing to coalesce.
+            self._handlers.get(kind, tag).append(value, step=step, timestamp=timestamp)
+            return
+
+        key = (kind, tag)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _BufferedSeries()
+            series.values.append(value)
+            series.steps.append(math.nan if step is None else float(step))
+            series.timestamps.append(time.time() if timestamp is None else timestamp)
+
+            if len(series.values) >= self._flush_size:
+                self._flush_series(key, series)
+            if time.monotonic() - self._last_flush >= self._flush_interval:
+                self._flush_all()
+
+    def _flush_all(self):
+        for key, series in self._series.items():
+            self._flush_series(key, series)
+        self._last_flush = time.monotonic()
+
+    def _flush_series(self, key, series):
+        if not series.values:
+            return
+
+        steps = series.series_steps.resolve(series.steps.tolist())
+        self._handlers.get(*key).extend(series.values.tolist(), steps=steps, timestamps=series.timestamps.tolist())
+        series.values, series.steps, series.timestamps = array("d"), array("d"), array("d")
@@ -0,0 +1,57 @@
+__all__ = ["shared_backend"]
+
+import threading
+from contextlib import contextmanager
+
+try:
+    from neptune.metadata_containers import metadata_container
+except ImportError:
+    # NOTE: Other versions of the client create their backends elsewhere,
+    #       in which case every run keeps creating its own.
+    metadata_container = None
+
+
+class _SharedBackend:
+    """Forwards everything to a backend shared by several runs, except closing it."""
+
+    def __init__(self, backend):
+        self._backend = backend
+
+    def __getattr__(self, name):
+        return getattr(self._backend, name)
+
+    def close(self):
+        pass
+
+
+@contextmanager
+def shared_backend():
+    """Makes the runs and projects created in the block share one backend per mode and credentials.
+
+    Creating a backend authenticates with Neptune and opens an HTTP connection pool,
+    which dominates the cost of exporting many small runs. The shared backends are
+    closed when the block exits.
+    """
+    if metadata_container is None:
+        yield
+        return
+
+    original = metadata_container.get_backend
+    backends = {}
+    lock = threading.Lock()
+
+    def get_backend(mode, api_token=None, proxies=None):
+        key = (mode, api_token, repr(proxies))
+        with lock:
+            backend = backends.get(key)
+            if backend is None:
+                backend = backends[key] = original(mode=mode, api_token=api_token, proxies=proxies)
+        return _SharedBackend(backend)
+
+    metadata_container.get_backend = get_backend
+    try:
+        yield
+    finally:
+        metadata_container.get_backend = original
+        for backend in backends.values():
+            backend.close()
@@ -0,0 +1,121 @@
+__all__ = ["Checkpoint", "CheckpointIndex", "user_cache_dir"]
+
+import hashlib
+import json
+import os
+import threading
+from collections import namedtuple
+
+import click
+
+CHECKPOINT_FILE_NAME = ".neptune-tensorboard-checkpoints.jsonl"
+
+# NOTE: `state` holds what the exports to the same namespace of the run share, e.g. the last step of every series,
+#       so that a resumed export continues where they stopped. It's missing from the manifests of older versions.
+Checkpoint = namedtuple("Checkpoint", ["custom_run_id", "offset", "step", "plugin_names", "state"], defaults=[None])
+
+
+def user_cache_dir():
+    """The directory neptune-tensorboard caches data in for the current user."""
+    cache_dir = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_dir, "neptune-tensorboard")
+
+
+class CheckpointIndex:
+    """JSON-lines manifest with the sync progress of every event file.
+
+    Each line records how far (in bytes) a file was uploaded, so the next sync
+    only has to read the records appended since then. Updates are appended,
+    the latest line for a file wins and the manifest is compacted on load.
+    A `read_only` index keeps its updates in memory and never writes the manifest.
+
+    The manifest is kept in the log directory, or in the cache directory of the user
+    if the log directory can't be written to, e.g. a mounted bucket. Checkpoints are
+    only an optimization, so if the manifest can't be written either, the index
+    keeps its updates in memory as well.
+    """
+
+    def __init__(self, log_dir, path=None, read_only=False):
+        self._log_dir = log_dir
+        self._path = path or _manifest_path(log_dir)
+        self._read_only = read_only
+        self._lock = threading.Lock()
+        self._checkpoints = self._load()
+
+    def get(self, event_file):
+        with self._lock:
+            return self._checkpoints.get(self._key(event_file))
+
+    def siblings(self, event_file, custom_run_id):
+        """Returns the checkpoints of the files in the directory of `event_file` exported to the run `custom_run_id`."""
+        directory = os.path.dirname(self._key(event_file))
+        with self._lock:
+            return [
+                checkpoint
+                for key, checkpoint in self._checkpoints.items()
+                if checkpoint.custom_run_id == custom_run_id and os.path.dirname(key) == directory
+            ]
+
+    def update(self, event_file, checkpoint):
+        key = self._key(event_file)
+        line = json.dumps({"path": key, **checkpoint._asdict()})
+        with self._lock:
+            self._checkpoints[key] = checkpoint
+            if self._read_only:
+                return
+            try:
+                os.makedirs(os.path.dirname(self._path), exist_ok=True)
+                with open(self._path, "a") as file:
+                    file.write(line + "\n")
+                    file.flush()
+                    os.fsync(file.fileno())
+            except OSError as e:
+                self._read_only = True
+                # user facing
+                click.echo(
+                    f"Cannot save the sync progress to '{self._path}', so interrupted exports "
+                    f"won't be resumed and grown files will be exported again from the start. Error: {e}"
+                )
+
+    def _key(self, event_file):
+        return os.path.relpath(event_file, self._log_dir)
+
+    def _load(self):
+        checkpoints = {}
+        if not os.path.exists(self._path):
+            return checkpoints
+
+        n_lines = 0
+        with open(self._path) as file:
+            for line in file:
+                n_lines += 1
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Line cut short by an interrupted sync.
+                    continue
+                key = entry.pop("path")
+                checkpoints[key] = Checkpoint(**entry)
+
+        if n_lines > len(checkpoints) and not self._read_only:
+            self._compact(checkpoints)
+        return checkpoints
+
+    def _compact(self, checkpoints):
+        tmp_path = self._path + ".tmp"
+        try:
+            with open(tmp_path, "w") as file:
+                for key, checkpoint in checkpoints.items():
+                    file.write(json.dumps({"path": key, **checkpoint._asdict()}) + "\n")
+            os.replace(tmp_path, self._path)
+        except OSError:
+            # The compaction is only an optimization.
+            pass
+
+
+def _manifest_path(log_dir):
+    path = os.path.join(log_dir, CHECKPOINT_FILE_NAME)
+    if os.access(path if os.path.exists(path) else log_dir, os.W_OK):
+        return path
+    log_dir_hash = hashlib.md5(os.path.abspath(log_dir).encode()).hexdigest()
+    return os.path.join(user_cache_dir(), "checkpoints", f"{log_dir_hash}.jsonl")
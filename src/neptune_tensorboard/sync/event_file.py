@@ -0,0 +1,251 @@
+__all__ = [
+    "DecodedValue",
+    "Histogram",
+    "SummaryDecoder",
+    "histogram_quantiles",
+    "image_extension",
+    "is_valid_event_file",
+    "read_events",
+    "read_records",
+]
+
+import struct
+from collections import namedtuple
+
+import numpy as np
+from google.protobuf.message import DecodeError
+from tensorboard.compat.proto import event_pb2
+from tensorboard.plugins.hparams import plugin_data_pb2
+from tensorboard.util import tensor_util
+
+# Every TFRecord is laid out as:
+#   uint64 length, uint32 masked_crc32c(length), byte data[length], uint32 masked_crc32c(data)
+_HEADER = struct.Struct("<QI")
+_FOOTER = struct.Struct("<I")
+
+_CRC32C_POLY = 0x82F63B78
+_CRC32C_MASK_DELTA = 0xA282EAD8
+
+
+def _make_crc32c_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ _CRC32C_POLY if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC32C_TABLE = _make_crc32c_table()
+
+
+def _masked_crc32c(data):
+    crc = 0xFFFFFFFF
+    for byte in data:
+        crc = _CRC32C_TABLE[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+    crc ^= 0xFFFFFFFF
+    return (((crc >> 15) | (crc << 17)) + _CRC32C_MASK_DELTA) & 0xFFFFFFFF
+
+
+def read_records(path, offset=0, verify_data_crc=False):
+    """Yields `(data, end_offset)` for every complete record in a TFRecord file.
+
+    The length of every record is CRC-checked. Checking the payload as well is
+    opt-in, as doing it in pure Python costs far more than decoding the record.
+    A truncated record at the end of the file (e.g. one which is still being
+    written) ends the iteration without an error.
+    """
+    with open(path, "rb") as file:
+        file.seek(offset)
+        while True:
+            header = file.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+
+            length, length_crc = _HEADER.unpack(header)
+            if _masked_crc32c(header[:8]) != length_crc:
+                # user facing
+                raise ValueError(f"neptune-tensorboard: Corrupted record length at offset {offset} in {path}.")
+
+            data = file.read(length)
+            footer = file.read(_FOOTER.size)
+            if len(data) < length or len(footer) < _FOOTER.size:
+                return
+
+            if verify_data_crc and _masked_crc32c(data) != _FOOTER.unpack(footer)[0]:
+                # user facing
+                raise ValueError(f"neptune-tensorboard: Corrupted record data at offset {offset} in {path}.")
+
+            offset += _HEADER.size + length + _FOOTER.size
+            yield data, offset
+
+
+def is_valid_event_file(path):
+    """Checks whether the first record of the file is a well-formed, CRC-checked event.
+
+    Only the first record is read, so this is cheap regardless of the file size.
+    """
+    try:
+        for data, _ in read_records(path, verify_data_crc=True):
+            event_pb2.Event.FromString(data)
+            return True
+    except (OSError, ValueError, DecodeError):
+        pass
+    return False
+
+
+def read_events(path, offset=0):
+    """Yields `(event, end_offset)` for every complete event in the file, starting at `offset`."""
+    for data, end_offset in read_records(path, offset=offset):
+        yield event_pb2.Event.FromString(data), end_offset
+
+
+# PyTorch and tensorboardX append it to the tags passed to `add_text`.
+_TEXT_TAG_SUFFIX = "/text_summary"
+# TF1 summaries append it to the tags of PR curves.
+_PR_CURVE_TAG_SUFFIX = "/pr_curves"
+
+# The quantiles shown by the distributions dashboard of TensorBoard, in basis points:
+# the minimum, the mean minus 1.5, 1 and 0.5 standard deviations of a normal distribution,
+# the median, the mean plus 0.5, 1 and 1.5 standard deviations and the maximum.
+DISTRIBUTION_BASIS_POINTS = (0, 668, 1587, 3085, 5000, 6915, 8413, 9332, 10000)
+
+DecodedValue = namedtuple("DecodedValue", ["kind", "tag", "value", "step", "wall_time"])
+# The left and right edges and the counts of the buckets of a histogram, as numpy arrays.
+Histogram = namedtuple("Histogram", ["lefts", "rights", "counts"])
+
+
+def _strip_suffix(tag, suffix):
+    return tag[: -len(suffix)] if tag.endswith(suffix) else tag
+
+
+def histogram_quantiles(histogram, basis_points=DISTRIBUTION_BASIS_POINTS):
+    """Interpolates the quantiles of a histogram, assuming the values are spread evenly within each bucket.
+
+    Returns None for an empty histogram.
+    """
+    lefts, rights, counts = histogram
+    total = counts.sum() if len(counts) else 0
+    if total <= 0:
+        return None
+
+    cumulative = np.cumsum(counts)
+    targets = np.asarray(basis_points, dtype=np.float64) / 10000 * total
+    buckets = np.minimum(np.searchsorted(cumulative, targets, side="right"), len(counts) - 1)
+    below = cumulative[buckets] - counts[buckets]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fractions = np.where(counts[buckets] > 0, (targets - below) / counts[buckets], 0)
+    fractions = np.clip(fractions, 0, 1)
+    return lefts[buckets] + fractions * (rights[buckets] - lefts[buckets])
+
+
+def image_extension(encoded_image):
+    if encoded_image.startswith(b"\xff\xd8"):
+        return "jpeg"
+    if encoded_image.startswith(b"GIF8"):
+        return "gif"
+    return "png"
+
+
+class SummaryDecoder:
+    """Turns events into scalars, encoded images and audio, text, histograms, PR curves, hparams and other tensors.
+
+    Summaries written by TF2 carry their plugin metadata only on the first value
+    of each tag, so the decoder remembers it for the following events. Pass the
+    `plugin_names` of a previous decoder to resume decoding in the middle of a file.
+    """
+
+    def __init__(self, plugin_names=None):
+        self._plugin_names = dict(plugin_names or {})
+
+    @property
+    def plugin_names(self):
+        return dict(self._plugin_names)
+
+    def decode(self, event):
+        if not event.HasField("summary"):
+            return
+
+        for value in event.summary.value:
+            if value.HasField("metadata") and value.metadata.plugin_data.plugin_name:
+                self._plugin_names[value.tag] = value.metadata.plugin_data.plugin_name
+            plugin_name = self._plugin_names.get(value.tag)
+
+            field = value.WhichOneof("value")
+            if field == "simple_value":
+                yield DecodedValue("scalar", value.tag, value.simple_value, event.step, event.wall_time)
+            elif field == "image":
+                yield DecodedValue("image", value.tag, value.image.encoded_image_string, event.step, event.wall_time)
+            elif field == "histo":
+                yield DecodedValue("histogram", value.tag, self._histogram(value.histo), event.step, event.wall_time)
+            elif field == "audio":
+                audio = (value.audio.encoded_audio_string, _audio_extension(value.audio.content_type))
+                yield DecodedValue("audio", value.tag, audio, event.step, event.wall_time)
+            elif plugin_name == "hparams":
+                # hparams are stored in the plugin metadata, the value itself is empty.
+                yield from self._decode_hparams(value, event)
+            elif field == "tensor":
+                yield from self._decode_tensor(value, plugin_name, event)
+
+    def _decode_tensor(self, value, plugin_name, event):
+        if plugin_name == "scalars":
+            scalar = tensor_util.make_ndarray(value.tensor).item()
+            yield DecodedValue("scalar", value.tag, scalar, event.step, event.wall_time)
+        elif plugin_name == "images":
+            # The first two elements are the width and height of the images.
+            for encoded_image in value.tensor.string_val[2:]:
+                yield DecodedValue("image", value.tag, encoded_image, event.step, event.wall_time)
+        elif plugin_name == "text":
+            strings = tensor_util.make_ndarray(value.tensor).flatten()
+            text = "\n".join(string.decode("utf-8", errors="replace") for string in strings)
+            yield DecodedValue("text", _strip_suffix(value.tag, _TEXT_TAG_SUFFIX), text, event.step, event.wall_time)
+        elif plugin_name == "histograms":
+            # One row of [left edge, right edge, count] per bucket.
+            buckets = tensor_util.make_ndarray(value.tensor).reshape(-1, 3).astype(np.float64)
+            histogram = Histogram(buckets[:, 0], buckets[:, 1], buckets[:, 2])
+            yield DecodedValue("histogram", value.tag, histogram, event.step, event.wall_time)
+        elif plugin_name == "audio":
+            # One row of [encoded audio, label] per clip.
+            clips = value.tensor.string_val[::2]
+            for index, encoded_audio in enumerate(clips):
+                tag = value.tag if len(clips) == 1 else f"{value.tag}/{index}"
+                yield DecodedValue("audio", tag, (encoded_audio, "wav"), event.step, event.wall_time)
+        elif plugin_name == "pr_curves":
+            # Rows of true positives, false positives, true negatives, false negatives, precision and recall,
+            # with a column per threshold.
+            curve = tensor_util.make_ndarray(value.tensor)
+            tag = _strip_suffix(value.tag, _PR_CURVE_TAG_SUFFIX)
+            yield DecodedValue("pr_curve", tag, curve, event.step, event.wall_time)
+        else:
+            # A generic tensor, e.g. written with `tf.summary.write`, or one of a plugin without a dedicated export.
+            try:
+                tensor = tensor_util.make_ndarray(value.tensor)
+            except (TypeError, ValueError):
+                tensor = None
+            yield DecodedValue("tensor", value.tag, tensor, event.step, event.wall_time)
+
+    @staticmethod
+    def _histogram(histo):
+        # NOTE: Each bucket ends at its limit and starts at the limit of the previous
+        #       one, while the outermost edges are bounded by the extremes of the values.
+        rights = np.asarray(histo.bucket_limit, dtype=np.float64)
+        lefts = np.concatenate(([histo.min], rights[:-1]))
+        return Histogram(
+            np.clip(lefts, histo.min, histo.max),
+            np.clip(rights, histo.min, histo.max),
+            np.asarray(histo.bucket, dtype=np.float64),
+        )
+
+    def _decode_hparams(self, value, event):
+        plugin_data = plugin_data_pb2.HParamsPluginData.FromString(value.metadata.plugin_data.content)
+        if not plugin_data.HasField("session_start_info"):
+            return
+        for name, hparam in plugin_data.session_start_info.hparams.items():
+            kind = hparam.WhichOneof("kind")
+            if kind in ("number_value", "string_value", "bool_value"):
+                yield DecodedValue("hparams", name, getattr(hparam, kind), event.step, event.wall_time)
+
+
+def _audio_extension(content_type):
+    return {"audio/mpeg": "mp3", "audio/ogg": "ogg"}.get(content_type, "wav")
@@ -0,0 +1,38 @@
+__all__ = ["read_embeddings"]
+
+import os
+
+from google.protobuf import text_format
+from tensorboard.plugins.projector.projector_config_pb2 import ProjectorConfig
+
+PROJECTOR_CONFIG_FILE = "projector_config.pbtxt"
+
+
+def read_embeddings(log_dir):
+    """Yields `(name, files)` for every embedding in the projector config of `log_dir`.
+
+    `files` maps "tensors", "metadata" and "sprite" to the paths of the files of
+    the embedding that exist. The embeddings stored in checkpoints are skipped.
+    """
+    config_path = os.path.join(log_dir, PROJECTOR_CONFIG_FILE)
+    if not os.path.isfile(config_path):
+        return
+
+    with open(config_path) as file:
+        try:
+            config = text_format.Parse(file.read(), ProjectorConfig())
+        except text_format.ParseError as e:
+            # user facing
+            raise ValueError(f"neptune-tensorboard: Malformed projector config {config_path}: {e}")
+
+    for embedding in config.embeddings:
+        paths = {
+            "tensors": embedding.tensor_path,
+            "metadata": embedding.metadata_path,
+            "sprite": embedding.sprite.image_path,
+        }
+        files = {kind: os.path.join(log_dir, path) for kind, path in paths.items() if path}
+        files = {kind: path for kind, path in files.items() if os.path.isfile(path)}
+        if files:
+            # PyTorch and tensorboardX name the embeddings "<tag>:<step>".
+            yield embedding.tensor_name.replace(":", "/"), files
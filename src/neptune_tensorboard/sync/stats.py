@@ -0,0 +1,50 @@
+__all__ = ["SyncStats"]
+
+import threading
+import time
+from collections import Counter
+
+
+class SyncStats:
+    """Counts what a sync read from the event files and, in a dry run, the operations it would have queued.
+
+    The counts are collected from all the worker threads, and `summary()` reports them
+    together with the end-to-end throughput since the stats were created.
+    """
+
+    def __init__(self):
+        self.paths = set()
+        self.bytes = 0
+        self.events = 0
+        self.values = Counter()
+        self.operations = 0
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+
+    def add_read(self, path, events, size, values):
+        """Records `events` records of `size` bytes read from `path`, with the number of values of each kind."""
+        with self._lock:
+            self.paths.add(path)
+            self.events += events
+            self.bytes += size
+            self.values.update(values)
+
+    def add_operations(self, count=1):
+        with self._lock:
+            self.operations += count
+
+    def seconds(self):
+        return time.monotonic() - self._start
+
+    def summary(self, dry_run=False):
+        with self._lock:
+            seconds = max(self.seconds(), 1e-9)
+            lines = [
+                f"neptune-tensorboard: {'Planned' if dry_run else 'Exported'} {len(self.paths)} event files, "
+                f"{self.bytes / 1e6:.2f} MB, {self.events} events in {seconds:.2f}s "
+                f"({self.events / seconds:.0f} events/s, {self.bytes / seconds / 1e6:.2f} MB/s)"
+            ]
+            lines.extend(f"{kind:<24}{count:>14}" for kind, count in sorted(self.values.items()))
+            if dry_run:
+                lines.append(f"{'projected operations':<24}{self.operations:>14}")
+        return "\n".join(lines)
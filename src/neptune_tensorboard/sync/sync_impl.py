@@ -1,106 +1,783 @@
 import hashlib
+import json
+import math
+import os
 import pathlib
+import threading
+import time
 import traceback
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
 import click
 import neptune
-from tensorboard.backend.event_processing.event_accumulator import EventAccumulator
+import numpy as np
+from neptune.envs import (
+    CONNECTION_MODE,
+    PROJECT_ENV_NAME,
+)
+from neptune.types import File
+
+from neptune_tensorboard.integration.images import ImageConverter
+from neptune_tensorboard.integration.utils import (
+    ContentCache,
+    HandlerCache,
+)
+from neptune_tensorboard.sync.backend import shared_backend
+from neptune_tensorboard.sync.checkpoint import (
+    Checkpoint,
+    CheckpointIndex,
+    user_cache_dir,
+)
+from neptune_tensorboard.sync.stats import SyncStats
+from neptune_tensorboard.sync.watch import EventFileWatcher
 
 try:
-    import tbparse
+    from neptune_tensorboard.sync.event_file import (
+        DISTRIBUTION_BASIS_POINTS,
+        SummaryDecoder,
+        histogram_quantiles,
+        image_extension,
+        is_valid_event_file,
+        read_events,
+    )
+    from neptune_tensorboard.sync.projector import (
+        PROJECTOR_CONFIG_FILE,
+        read_embeddings,
+    )
 except ModuleNotFoundError:
     # user facing
     raise ModuleNotFoundError(
-        "neptune-tensorboard: tbparse is required for exporting logs. Install it with: pip install tbparse"
+        "neptune-tensorboard: tensorboard is required for exporting logs. Install it with: pip install tensorboard"
     )
 
 
+# How many bytes of an event file are uploaded between two checkpoints.
+CHECKPOINT_INTERVAL_BYTES = 64 * 1024 * 1024
+# How long the custom_run_ids fetched from a project are reused, in seconds.
+RUN_IDS_CACHE_TTL = 10 * 60
+CUSTOM_RUN_ID_ATTRIBUTE = "sys/custom_run_id"
+# How many points of a scalar series are uploaded with a single `extend`.
+SCALAR_BATCH_SIZE = 1000
+# How many points of all the series of a file are held at most before they are all uploaded,
+# so that the memory used by the batchers doesn't grow with the number of tags.
+MAX_PENDING_POINTS = 100_000
+# Names of the series the quantiles of histograms are logged to, as in the distributions dashboard.
+QUANTILE_NAMES = tuple(
+    {0: "min", 10000: "max"}.get(basis_points, f"p{basis_points / 100:g}") for basis_points in DISTRIBUTION_BASIS_POINTS
+)
+# How the event files are exported: one run per event file, or one run per directory directly in the log directory.
+GROUPINGS = ("file", "run_dir")
+# Connection modes in which the runs never reach the Neptune servers, so there is no project to look runs up in.
+LOCAL_MODES = ("offline", "debug")
+PR_CURVE_COLUMNS = ("true_positives", "false_positives", "true_negatives", "false_negatives", "precision", "recall")
+
+
 def compute_md5_hash(path):
     return hashlib.md5(path.encode()).hexdigest()
 
 
 class DataSync:
-    def __init__(self, project, api_token, path):
+    def __init__(
+        self,
+        project,
+        api_token,
+        path,
+        workers=1,
+        run_ids_cache_ttl=RUN_IDS_CACHE_TTL,
+        image_policy=None,
+        group_by="file",
+        mode=None,
+        dry_run=False,
+    ):
+        if workers < 1:
+            raise ValueError(f"neptune-tensorboard: `workers` must be a positive integer, got {workers}.")
+        if group_by not in GROUPINGS:
+            raise ValueError(f"neptune-tensorboard: `group_by` must be one of {GROUPINGS}, got {group_by!r}.")
+
         self._project = project
         self._api_token = api_token
         self._path = path
+        self._workers = workers
+        self._run_ids_cache_ttl = run_ids_cache_ttl
+        self._image_policy = image_policy
+        self._group_by = group_by
+        # NOTE: Passed to `neptune.init_run()`, e.g. "offline" to queue the runs on disk and `neptune sync` them later.
+        self._mode = mode
+        self._dry_run = dry_run
+        self._run_stopper = None
+        self._stats = None
+        # NOTE: Shared by all the exported files, so that an image logged to several
+        #       of them is only re-encoded once, and bounding the memory taken by the
+        #       images remembered to recognize repeated ones.
+        self._image_cache = ContentCache()
+        self._run_ids_lock = threading.Lock()
 
     def run(self):
+        """Exports the event files in the log directory and prints how many events were read, and how fast.
+
+        In a dry run, the files are read, decoded and planned as usual, but nothing is uploaded
+        and no checkpoint is saved. The summary then also counts the operations the export would queue.
+        """
+        with self._session() as stats:
+            self._prepare()
+            # Inspect if files correspond to EventFiles.
+            paths = pathlib.Path(self._path).glob("**/*tfevents*")
+            self._sync_groups(self._group_paths(paths))
+
+        # NOTE: Only reported once the runs are stopped, so the throughput includes the upload.
+        # user facing
+        click.echo(stats.summary(dry_run=self._dry_run))
+
+    def _sync_groups(self, groups):
+        if self._workers == 1:
+            for source, group in groups:
+                self._sync_group(source, group)
+            return
+
+        # NOTE: `glob` is lazy, so we only keep a bounded number of files
+        #       in flight instead of submitting the whole tree to the pool
+        #       upfront. This keeps memory flat for huge log directories.
+        slots = threading.BoundedSemaphore(2 * self._workers)
+        with ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="neptune-tensorboard-sync") as executor:
+            for source, group in groups:
+                slots.acquire()
+                future = executor.submit(self._sync_group, source, group)
+                future.add_done_callback(lambda _: slots.release())
+
+    def watch(self, idle_timeout=300, poll_interval=1.0):
+        """Keeps exporting the events appended to the event files in the log directory until interrupted.
+
+        Runs stay open while their event files keep growing and are closed once
+        they haven't changed for `idle_timeout` seconds.
+        """
+        with self._session():
+            self._prepare()
+            self._watch(idle_timeout, poll_interval)
+
+    def _watch(self, idle_timeout, poll_interval):
+        watcher = EventFileWatcher(self._path)
+        exports, last_changes, skipped = {}, {}, set()
+        # custom_run_id -> [run, number of open exports, the state shared by the exports of each namespace]
+        runs = {}
+        try:
+            while True:
+                now = time.monotonic()
+                for path in watcher.changed_files():
+                    if path in skipped:
+                        continue
+                    try:
+                        if path not in exports:
+                            # The file may be too fresh to hold a complete record yet.
+                            if not self._is_valid_tf_event_file(path):
+                                continue
+
+                            source = self._source_for(path)
+                            checkpoint = self._checkpoint_for(path, compute_md5_hash(source))
+                            if checkpoint is None:
+                                # user facing
+                                click.echo(f"{path} was already synchronized")
+                                skipped.add(path)
+                                continue
+                            if os.path.getsize(path) <= checkpoint.offset:
+                                continue
+
+                            exports[path] = self._open_shared_export(source, path, checkpoint, runs)
+                            # user facing
+                            click.echo(f"Watching {path}, run_id: {checkpoint.custom_run_id}")
+
+                        exports[path].export_new_events()
+                        last_changes[path] = now
+                    except Exception as e:
+                        skipped.add(path)
+                        self._report_error(path, e)
+
+                for path, last_change in list(last_changes.items()):
+                    if now - last_change >= idle_timeout:
+                        del last_changes[path]
+                        self._close_shared_export(exports.pop(path), runs)
+                        # user facing
+                        click.echo(f"{path} has been idle for {idle_timeout}s, its export was closed")
+
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+            for export in exports.values():
+                self._close_shared_export(export, runs)
+
+    @contextmanager
+    def _session(self):
+        # NOTE: All the runs share one authenticated backend, and each run is
+        #       stopped in the background while the next one is already exported.
+        with shared_backend():
+            self._stats = SyncStats()
+            self._run_stopper = _RunStopper(max_pending=self._workers, report_error=self._report_error)
+            try:
+                yield self._stats
+            finally:
+                self._run_stopper.close()
+                self._run_stopper = None
+
+    def _stop_run(self, run, source):
+        if self._run_stopper is None:
+            run.stop()
+        else:
+            self._run_stopper.stop(run, source)
+
+    def _prepare(self):
         # NOTE: Fetching custom_run_ids is not a trivial operation, so
         #       we cache the custom_run_ids here.
-        self._existing_custom_run_ids = self._get_existing_neptune_custom_run_ids()
-        # Inspect if files correspond to EventFiles.
-        for path in pathlib.Path(self._path).glob("**/*tfevents*"):
-            try:
-                # methods below expect path to be str.
-                str_path = str(path)
-
-                # only try export for valid files i.e. files which EventAccumulator
-                # can actually read.
-                if self._is_valid_tf_event_file(str_path):
-                    self._export_to_neptune_run(str_path)
-            except Exception as e:
-                # user facing
-                click.echo("Cannot load run from file '{}'. ".format(path) + "Error: " + str(e))
-                try:
-                    traceback.print_exc(e)
-                except:  # noqa: E722
-                    pass
+        if self._looks_up_runs():
+            self._existing_custom_run_ids = self._get_existing_neptune_custom_run_ids()
+        else:
+            # NOTE: Without a project, runs exported before checkpoints were introduced aren't detected.
+            self._existing_custom_run_ids = set()
+        self._checkpoints = CheckpointIndex(self._path, read_only=self._dry_run)
 
-    def _is_valid_tf_event_file(self, path):
-        accumulator = EventAccumulator(path)
-        accumulator.Reload()
+    def _group_paths(self, paths):
+        """Yields the event files exported to the same run, with the path the run is identified by."""
+        if self._group_by == "file":
+            # methods below expect path to be str.
+            return ((str(path), [str(path)]) for path in paths)
+
+        groups = {}
+        for path in paths:
+            groups.setdefault(self._source_for(str(path)), []).append(str(path))
+        return groups.items()
+
+    def _source_for(self, path):
+        """Returns the path identifying the run `path` is exported to, either the file or its run directory."""
+        if self._group_by == "file":
+            return path
+        parts = pathlib.PurePath(os.path.relpath(path, self._path)).parts
+        return self._path if len(parts) == 1 else os.path.join(self._path, parts[0])
+
+    def _namespace_for(self, source, path):
+        """Maps the subdirectories of a run directory, e.g. `train/` and `validation/`, to namespaces of its run."""
+        if self._group_by == "file":
+            return "tensorboard"
+        subdir = os.path.relpath(os.path.dirname(path), source)
+        return "tensorboard" if subdir == "." else f"tensorboard/{pathlib.PurePath(subdir).as_posix()}"
+
+    def _sync_group(self, source, paths):
         try:
-            accumulator.FirstEventTimestamp()
-        except ValueError:
-            return False
-        return True
+            # only try export for valid files i.e. files whose first record
+            # is a well-formed event.
+            paths = [path for path in paths if self._is_valid_tf_event_file(path)]
+            if paths:
+                self._export_to_neptune_run(source, paths)
+        except Exception as e:
+            self._report_error(source, e)
+
+    def _report_error(self, path, e):
+        # user facing
+        click.echo("Cannot load run from file '{}'. ".format(path) + "Error: " + str(e))
+        try:
+            traceback.print_exc(e)
+        except:  # noqa: E722
+            pass
+
+    def _is_valid_tf_event_file(self, path):
+        return is_valid_event_file(path)
+
+    def _looks_up_runs(self):
+        """Whether the runs are created in a project, which the existing custom_run_ids are looked up in."""
+        return not self._dry_run and (self._mode or os.getenv(CONNECTION_MODE)) not in LOCAL_MODES
 
     def _get_existing_neptune_custom_run_ids(self):
+        cache_path = self._run_ids_cache_path()
+        cached = self._load_cached_run_ids(cache_path)
+        if cached is not None:
+            run_ids, _ = cached
+            return run_ids
+
         with neptune.init_project(project=self._project, api_token=self._api_token) as project:
-            try:
-                return {run_id for run_id in project.fetch_runs_table().to_pandas()["sys/custom_run_id"].to_list()}
-            except KeyError:
-                # empty project
-                return set()
+            # NOTE: Only the custom_run_id column is fetched and the table is
+            #       consumed as it's paged in, instead of loading every
+            #       attribute of every run into a DataFrame.
+            table = project.fetch_runs_table(columns=[CUSTOM_RUN_ID_ATTRIBUTE])
+            run_ids = set()
+            for entry in table:
+                try:
+                    run_ids.add(entry.get_attribute_value(CUSTOM_RUN_ID_ATTRIBUTE))
+                except ValueError:
+                    # run without custom_run_id
+                    pass
+
+        self._store_cached_run_ids(cache_path, run_ids)
+        return run_ids
+
+    def _run_ids_cache_path(self):
+        project = self._project or os.getenv(PROJECT_ENV_NAME)
+        if not project or not self._run_ids_cache_ttl:
+            return None
+        return os.path.join(user_cache_dir(), f"{compute_md5_hash(project)}.json")
+
+    def _load_cached_run_ids(self, cache_path):
+        """Returns the cached custom_run_ids and when they were fetched, or None if there are none up to date."""
+        if cache_path is None:
+            return None
+        try:
+            with open(cache_path) as file:
+                cache = json.load(file)
+            fetched_at, run_ids = float(cache["fetched_at"]), set(cache["custom_run_ids"])
+        except (OSError, ValueError, KeyError, TypeError):
+            # Missing, or written by an interrupted or incompatible sync, so it's treated as stale.
+            return None
+        if time.time() - fetched_at > self._run_ids_cache_ttl:
+            return None
+        return run_ids, fetched_at
+
+    def _store_cached_run_ids(self, cache_path, run_ids, fetched_at=None):
+        if cache_path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as file:
+                json.dump({"fetched_at": fetched_at or time.time(), "custom_run_ids": sorted(run_ids)}, file)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            # The cache is only an optimization.
+            pass
 
     def _experiment_exists(self, hash_run_id, run_path):
         return hash_run_id in self._existing_custom_run_ids
 
-    def _export_to_neptune_run(self, path):
+    def _checkpoint_for(self, path, custom_run_id):
+        checkpoint = self._checkpoints.get(path)
+        if checkpoint is not None:
+            return checkpoint
+
+        # NOTE: Runs exported before checkpoints were introduced
+        #       can't be resumed, so we keep skipping them.
+        if self._group_by == "file" and self._experiment_exists(custom_run_id, self._project):
+            return None
+
+        return Checkpoint(custom_run_id=custom_run_id, offset=0, step=None, plugin_names={})
+
+    def _init_run(self, custom_run_id):
+        if self._dry_run:
+            return _DryRun(self._stats)
+
+        # NOTE: If a run with the given custom_run_id already exists, it's resumed.
+        run = neptune.init_run(
+            custom_run_id=custom_run_id,
+            project=self._project,
+            api_token=self._api_token,
+            mode=self._mode,
+            capture_hardware_metrics=False,
+        )
+        if self._looks_up_runs():
+            self._cache_run_id(custom_run_id)
+        return run
+
+    def _cache_run_id(self, custom_run_id):
+        """Adds a created run to the cached custom_run_ids, so the next syncs see it even if it wasn't checkpointed."""
+        cache_path = self._run_ids_cache_path()
+        with self._run_ids_lock:
+            self._existing_custom_run_ids.add(custom_run_id)
+            cached = self._load_cached_run_ids(cache_path)
+            if cached is None:
+                # The next sync fetches the custom_run_ids anyway.
+                return
+            run_ids, fetched_at = cached
+            if custom_run_id not in run_ids:
+                self._store_cached_run_ids(cache_path, run_ids | {custom_run_id}, fetched_at=fetched_at)
+
+    def _open_export(self, path, checkpoint, run, base_namespace="tensorboard", namespaces=None):
+        if checkpoint.offset == 0:
+            # Record the run before uploading anything, so that an interrupted
+            # export is resumed by the next sync instead of being skipped.
+            self._checkpoints.update(path, checkpoint)
+
+        # NOTE: The files exported to the same namespace share their handlers, batchers and image converter,
+        #       so that their steps are checked against each other and their images sampled together.
+        namespaces = {} if namespaces is None else namespaces
+        if base_namespace not in namespaces:
+            image_converter = ImageConverter(self._image_policy, cache=self._image_cache)
+            namespace = namespaces[base_namespace] = _Namespace(run, base_namespace, image_converter)
+            # NOTE: A resumed run continues from the state saved with the checkpoints of the namespace,
+            #       so that its series don't go back to earlier steps, nor its files overwrite earlier ones.
+            for sibling in self._checkpoints.siblings(path, checkpoint.custom_run_id):
+                if sibling.state:
+                    namespace.restore(sibling.state)
+        return _RunExport(path, run, checkpoint, self._checkpoints, namespaces[base_namespace], stats=self._stats)
+
+    def _open_shared_export(self, source, path, checkpoint, runs):
+        entry = runs.get(checkpoint.custom_run_id)
+        if entry is None:
+            entry = runs[checkpoint.custom_run_id] = [self._init_run(checkpoint.custom_run_id), 0, {}]
+        run, _, namespaces = entry
+        if checkpoint.offset == 0:
+            run["tensorboard_path"] = source
+
+        export = self._open_export(path, checkpoint, run, self._namespace_for(source, path), namespaces)
+        entry[1] += 1
+        return export
+
+    def _close_shared_export(self, export, runs):
+        export.close()
+        entry = runs[export.custom_run_id]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del runs[export.custom_run_id]
+            self._stop_run(entry[0], export.path)
+
+    def _export_to_neptune_run(self, source, paths):
         # custom_run_id supports str with max length of 32.
-        hash_run_id = compute_md5_hash(path)
+        custom_run_id = compute_md5_hash(source)
 
-        if self._experiment_exists(hash_run_id, self._project):
-            # user facing
-            click.echo(f"{path} was already synchronized")
+        pending = []
+        # NOTE: The files of a run directory are exported in the order they were started in, e.g. after restarts.
+        for path in sorted(paths, key=_first_wall_time):
+            checkpoint = self._checkpoint_for(path, custom_run_id)
+            if checkpoint is None or os.path.getsize(path) <= checkpoint.offset:
+                # user facing
+                click.echo(f"{path} was already synchronized")
+            else:
+                pending.append((path, checkpoint))
+        if not pending:
             return
 
-        with neptune.init_run(
-            custom_run_id=hash_run_id, project=self._project, api_token=self._api_token, capture_hardware_metrics=False
-        ) as run:
-            run["tensorboard_path"] = path
+        run = self._init_run(custom_run_id)
+        try:
+            if any(checkpoint.offset == 0 for _, checkpoint in pending):
+                run["tensorboard_path"] = source
+
+            namespaces = {}
+            for path, checkpoint in pending:
+                try:
+                    export = self._open_export(path, checkpoint, run, self._namespace_for(source, path), namespaces)
+                    try:
+                        export.export_new_events()
+                    finally:
+                        export.close()
+                except Exception as e:
+                    self._report_error(path, e)
+                    continue
+
+                # user facing
+                if self._dry_run:
+                    click.echo(f"{path} would be exported with run_id: {checkpoint.custom_run_id}")
+                elif checkpoint.offset == 0:
+                    click.echo(f"{path} was exported with run_id: {checkpoint.custom_run_id}")
+                else:
+                    click.echo(f"{path} was updated with new events, run_id: {checkpoint.custom_run_id}")
+        finally:
+            self._stop_run(run, source)
+
+
+class _RunExport:
+    """Uploads the events of a single event file to a Neptune run, picking up where the last call ended."""
+
+    def __init__(
+        self,
+        path,
+        run,
+        checkpoint,
+        checkpoints,
+        namespace=None,
+        stats=None,
+    ):
+        self._path = path
+        self._run = run
+        self._checkpoint = checkpoint
+        self._checkpoints = checkpoints
+        self._namespace = _Namespace(run) if namespace is None else namespace
+        self._handlers = self._namespace.handlers
+        self._image_converter = self._namespace.image_converter
+        self._decoder = SummaryDecoder(checkpoint.plugin_names)
+        self._series_batchers = self._namespace.series_batchers
+        self._pending_points = 0
+        # NOTE: Only the last curve of every tag is uploaded, on every flush.
+        self._pr_curves = {}
+        self._skipped_tensors = set()
+        self._stats = stats
+        self._offset = checkpoint.offset
+        self._step = checkpoint.step
+
+    def export_new_events(self):
+        """Uploads the events appended since the previous call and returns the number of bytes read."""
+        start_offset = self._offset
+        events, values = 0, Counter()
+        for event, offset in read_events(self._path, offset=start_offset):
+            events += 1
+            # NOTE: A summary may hold several images, which are uploaded together to keep steps of their own.
+            images = {}
+            for value in self._decoder.decode(event):
+                values[value.kind] += 1
+                if value.kind == "scalar":
+                    self._append_point("scalar", value.tag, value.value, value.step, value.wall_time)
+                elif value.kind == "image":
+                    # Images (and figures) are already encoded, so they are only re-encoded if the policy asks for it.
+                    image = self._image_converter.convert_encoded(value.tag, value.value, image_extension(value.value))
+                    if image is not None:
+                        images.setdefault(value.tag, []).append(image)
+                elif value.kind == "histogram":
+                    self._export_histogram(value)
+                elif value.kind == "pr_curve":
+                    self._export_pr_curve(value)
+                elif value.kind == "audio":
+                    # NOTE: File series only accept images, so every clip is a file of its own,
+                    #       named after its step. The clips logged at the same step are numbered.
+                    content, extension = value.value
+                    self._handlers.upload_unique(
+                        "audio", value.tag, str(value.step), File.from_content(content, extension=extension)
+                    )
+                elif value.kind == "tensor":
+                    self._export_tensor(value)
+                else:
+                    self._handlers.append(
+                        value.kind, value.tag, value.value, step=value.step, timestamp=value.wall_time
+                    )
+            for tag, tag_images in images.items():
+                self._handlers.extend("image", tag, tag_images, step=event.step, timestamp=event.wall_time)
+            self._offset, self._step = offset, event.step
+
+            if self._offset - self._checkpoint.offset >= CHECKPOINT_INTERVAL_BYTES:
+                self._save_checkpoint()
+
+        self._flush_series()
+        if self._stats is not None:
+            self._stats.add_read(self._path, events, self._offset - start_offset, values)
+        return self._offset - start_offset
 
-            namespace_handler = run["tensorboard"]
+    @property
+    def path(self):
+        return self._path
 
-            # parse events file
-            reader = tbparse.SummaryReader(path)
+    @property
+    def custom_run_id(self):
+        return self._checkpoint.custom_run_id
 
-            # Read scalars
-            for scalar in reader.scalars.itertuples():
-                namespace_handler["scalar"][scalar.tag].append(scalar.value)
+    def close(self):
+        """Uploads what is left of the file. The run is left open, as other files may be exported to it."""
+        if self._export_embeddings() or self._offset > self._checkpoint.offset:
+            self._save_checkpoint()
+
+    def _export_histogram(self, value):
+        quantiles = histogram_quantiles(value.value)
+        if quantiles is None:
+            return
+        for name, quantile in zip(QUANTILE_NAMES, quantiles.tolist()):
+            self._append_point("histograms", f"{value.tag}/{name}", quantile, value.step, value.wall_time)
+
+    def _export_tensor(self, value):
+        tensor = value.value
+        if tensor is not None and tensor.size == 1 and tensor.dtype.kind in "biuf":
+            self._append_point("tensors", value.tag, float(tensor.item()), value.step, value.wall_time)
+        elif value.tag not in self._skipped_tensors:
+            self._skipped_tensors.add(value.tag)
+            # user facing
+            click.echo(
+                f"Skipping the tensors of '{value.tag}' in '{self._path}', "
+                f"as only tensors holding a single number can be exported"
+            )
 
-            # Read images (and figures)
-            for image in reader.images.itertuples():
-                namespace_handler["image"][image.tag].append(neptune.types.File.as_image(image.value))
+    def _export_pr_curve(self, value):
+        curve = value.value
+        precision, recall = curve[4], curve[5]
+        # NOTE: Recall decreases with the threshold, so the curve is integrated from the last threshold.
+        average_precision = float(np.sum(-np.diff(recall, append=0) * precision))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            f1 = np.nan_to_num(2 * precision * recall / (precision + recall))
+        self._append_point(
+            "pr_curves", f"{value.tag}/average_precision", average_precision, value.step, value.wall_time
+        )
+        self._append_point("pr_curves", f"{value.tag}/best_f1", float(f1.max()), value.step, value.wall_time)
+        self._pr_curves[value.tag] = curve
 
-            # Read text
-            for text in reader.text.itertuples():
-                namespace_handler["text"][text.tag].append(text.value)
+    def _export_embeddings(self):
+        """Uploads the embeddings of the projector config next to the file, unless they were uploaded already.
 
-            # Read hparams
-            for hparam in reader.hparams.itertuples():
-                namespace_handler["hparams"][hparam.tag].append(hparam.value)
+        Returns whether they were uploaded.
+        """
+        log_dir = os.path.dirname(self._path)
+        try:
+            mtime = os.path.getmtime(os.path.join(log_dir, PROJECTOR_CONFIG_FILE))
+        except OSError:
+            # No projector config.
+            return False
+        # NOTE: The config is rewritten whenever an embedding is added, so the
+        #       embeddings are only uploaded again once it was modified.
+        if mtime == self._namespace.projector_mtime:
+            return False
 
+        try:
+            embeddings = list(read_embeddings(log_dir))
+        except (OSError, ValueError) as e:
             # user facing
-            click.echo(f"{path} was exported with run_id: {hash_run_id}")
+            click.echo(f"Cannot read the projector config of '{self._path}'. Error: {e}")
+            return False
+        for name, files in embeddings:
+            for kind, path in files.items():
+                self._handlers.get("embeddings", name)[kind].upload(path)
+        self._namespace.projector_mtime = mtime
+        return True
+
+    def _append_point(self, kind, tag, value, step, wall_time):
+        batcher = self._series_batchers.get((kind, tag))
+        if batcher is None:
+            batcher = self._series_batchers[(kind, tag)] = _SeriesBatcher(self._handlers, kind, tag)
+        batcher.append(value, step, wall_time)
+
+        self._pending_points += 1
+        if self._pending_points >= MAX_PENDING_POINTS:
+            self._flush_series()
+
+    def _flush_series(self):
+        for batcher in self._series_batchers.values():
+            batcher.flush()
+        self._pending_points = 0
+        for tag, curve in self._pr_curves.items():
+            self._handlers.get("pr_curves", tag)["curve"].upload(
+                File.from_content(_curve_to_csv(curve), extension="csv")
+            )
+        self._pr_curves.clear()
+
+    def _save_checkpoint(self):
+        self._flush_series()
+        # Only mark events as synchronized once Neptune has actually received them.
+        self._run.wait()
+        self._checkpoint = self._checkpoint._replace(
+            offset=self._offset,
+            step=self._step,
+            plugin_names=self._decoder.plugin_names,
+            state=self._namespace.state(),
+        )
+        self._checkpoints.update(self._path, self._checkpoint)
+
+
+class _Namespace:
+    """What the exports of the files in the same namespace of a run share, saved with their checkpoints."""
+
+    def __init__(self, run, name="tensorboard", image_converter=None):
+        self.name = name
+        self.handlers = HandlerCache(run[name])
+        self.image_converter = ImageConverter() if image_converter is None else image_converter
+        self.series_batchers = {}
+        # NOTE: Modification time of the projector config whose embeddings were uploaded.
+        self.projector_mtime = None
+
+    def state(self):
+        return {
+            "handlers": self.handlers.state(),
+            "images": self.image_converter.state(),
+            "projector_mtime": self.projector_mtime,
+        }
+
+    def restore(self, state):
+        """Continues from the `state()` saved with the checkpoint of an earlier export to the namespace."""
+        self.handlers.restore(state["handlers"])
+        self.image_converter.restore(state.get("images", {}))
+        projector_mtime = state.get("projector_mtime")
+        if projector_mtime is not None and (self.projector_mtime is None or projector_mtime > self.projector_mtime):
+            self.projector_mtime = projector_mtime
+
+
+class _RunStopper:
+    """Stops runs on background threads, waiting for at most `max_pending` of them at a time.
+
+    Stopping a run waits until all its metadata is uploaded, which can overlap with exporting the next one.
+    """
+
+    def __init__(self, max_pending, report_error):
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._report_error = report_error
+        self._executor = ThreadPoolExecutor(max_workers=max_pending, thread_name_prefix="neptune-tensorboard-stop")
+
+    def stop(self, run, source):
+        self._slots.acquire()
+        self._executor.submit(self._stop, run, source)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def _stop(self, run, source):
+        try:
+            run.stop()
+        except Exception as e:
+            self._report_error(source, e)
+        finally:
+            self._slots.release()
+
+
+class _DryRun:
+    """Stands in for a run in a dry run: it accepts everything logged to it and only counts the operations."""
+
+    def __init__(self, stats):
+        self._handler = _DryRunHandler(stats)
+
+    def __getitem__(self, path):
+        return self._handler
+
+    def __setitem__(self, path, value):
+        self._handler[path] = value
+
+    def wait(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class _DryRunHandler:
+    def __init__(self, stats):
+        self._stats = stats
+
+    def __getitem__(self, path):
+        return self
+
+    def __setitem__(self, path, value):
+        self._stats.add_operations()
+
+    def append(self, *args, **kwargs):
+        self._stats.add_operations()
+
+    def extend(self, *args, **kwargs):
+        self._stats.add_operations()
+
+    def upload(self, *args, **kwargs):
+        self._stats.add_operations()
+
+
+def _first_wall_time(path):
+    for event, _ in read_events(path):
+        return event.wall_time
+    return math.inf
+
+
+class _SeriesBatcher:
+    """Collects the points of a series and uploads them with a single `extend` per batch."""
+
+    def __init__(self, handlers, kind, tag, batch_size=SCALAR_BATCH_SIZE):
+        self._handlers = handlers
+        self._kind, self._tag = kind, tag
+        self._batch_size = batch_size
+        self._values, self._steps, self._timestamps = [], [], []
+
+    def append(self, value, step, timestamp):
+        # NOTE: Repeated steps don't end a batch, they are resolved with the other steps of the batch on flush.
+        self._values.append(value)
+        self._steps.append(step)
+        self._timestamps.append(timestamp)
+        if len(self._values) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._values:
+            return
+        steps = self._handlers.resolve_steps(self._kind, self._tag, self._steps)
+        self._handlers.get(self._kind, self._tag).extend(self._values, steps=steps, timestamps=self._timestamps)
+        self._values, self._steps, self._timestamps = [], [], []
+
+
+def _curve_to_csv(curve):
+    thresholds = np.linspace(0, 1, curve.shape[1])
+    lines = [",".join(("threshold",) + PR_CURVE_COLUMNS)]
+    lines.extend(",".join(f"{number:g}" for number in row) for row in zip(thresholds, *curve))
+    return "\n".join(lines) + "\n"
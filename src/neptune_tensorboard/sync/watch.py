@@ -0,0 +1,113 @@
+__all__ = ["EventFileWatcher"]
+
+import os
+import threading
+from importlib.util import find_spec
+
+IS_WATCHDOG_AVAILABLE = find_spec("watchdog")
+if IS_WATCHDOG_AVAILABLE:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+
+    class _EventFileHandler(FileSystemEventHandler):
+        def __init__(self, on_change):
+            self._on_change = on_change
+
+        def on_created(self, event):
+            if not event.is_directory:
+                self._on_change(event.src_path)
+
+        def on_modified(self, event):
+            if not event.is_directory:
+                self._on_change(event.src_path)
+
+        def on_moved(self, event):
+            if not event.is_directory:
+                self._on_change(event.dest_path)
+
+
+def _is_event_file(path):
+    return "tfevents" in os.path.basename(path)
+
+
+class EventFileWatcher:
+    """Tracks event files which were created or have grown under a log directory.
+
+    Uses inotify (or the platform equivalent) through `watchdog` when it's installed,
+    e.g. with `pip install neptune-tensorboard[watch]`.
+    Otherwise it falls back to polling, which only rescans the directories whose
+    mtime changed and stats the known event files instead of re-globbing the tree.
+    """
+
+    def __init__(self, log_dir):
+        self._dir_mtimes = {}
+        self._file_sizes = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._observer = None
+
+        if IS_WATCHDOG_AVAILABLE:
+            self._observer = Observer()
+            self._observer.schedule(_EventFileHandler(self._on_change), log_dir, recursive=True)
+            self._observer.start()
+
+        # Files that existed before the watcher was started are reported on the first call as well.
+        self._scan_dir(log_dir, self._pending)
+
+    def changed_files(self):
+        """Returns the event files created or modified since the previous call."""
+        if self._observer is None:
+            self._poll()
+
+        with self._lock:
+            changed, self._pending = self._pending, set()
+        return sorted(changed)
+
+    def close(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+
+    def _on_change(self, path):
+        if _is_event_file(path):
+            with self._lock:
+                self._pending.add(path)
+
+    def _poll(self):
+        changed = set()
+        for directory, mtime in list(self._dir_mtimes.items()):
+            try:
+                current_mtime = os.stat(directory).st_mtime_ns
+            except FileNotFoundError:
+                del self._dir_mtimes[directory]
+                continue
+            if current_mtime != mtime:
+                self._scan_dir(directory, changed)
+
+        for path, size in list(self._file_sizes.items()):
+            try:
+                current_size = os.stat(path).st_size
+            except FileNotFoundError:
+                del self._file_sizes[path]
+                continue
+            if current_size != size:
+                self._file_sizes[path] = current_size
+                changed.add(path)
+
+        with self._lock:
+            self._pending.update(changed)
+
+    def _scan_dir(self, directory, changed):
+        try:
+            self._dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            return
+
+        for entry in entries:
+            if entry.is_dir():
+                if entry.path not in self._dir_mtimes:
+                    self._scan_dir(entry.path, changed)
+            elif _is_event_file(entry.path) and entry.path not in self._file_sizes:
+                self._file_sizes[entry.path] = entry.stat().st_size
+                changed.add(entry.path)
@@ -6,14 +6,120 @@ import click
 @click.command("tensorboard")
 @click.option("--project", help="Neptune Project name")
 @click.option("--api_token", help="Neptune API token")
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of event files exported in parallel",
+)
+@click.option(
+    "--group_by",
+    type=click.Choice(["file", "run_dir"]),
+    default="file",
+    show_default=True,
+    help="Export one run per event file, or one per directory in `log_dir`, with its subdirectories as namespaces",
+)
+@click.option(
+    "--mode",
+    type=click.Choice(["async", "sync", "offline", "debug"]),
+    help="Connection mode of the created runs, e.g. offline to store them locally and upload them later with "
+    "`neptune sync` [default: the NEPTUNE_MODE environment variable, or async]",
+)
+@click.option(
+    "--dry_run",
+    "--dry-run",
+    is_flag=True,
+    help="Read and plan the export without uploading anything, and report what would be exported",
+)
+@click.option(
+    "--watch",
+    is_flag=True,
+    help="Keep exporting new events until interrupted. Install neptune-tensorboard[watch] "
+    "to be notified of new events instead of polling for them",
+)
+@click.option(
+    "--idle_timeout",
+    type=click.FloatRange(min=0),
+    default=300,
+    show_default=True,
+    help="With --watch, seconds without new events after which the run of an event file is closed",
+)
+@click.option(
+    "--image_max_resolution",
+    type=click.IntRange(min=1),
+    help="Images whose longer side exceeds this many pixels are downscaled",
+)
+@click.option(
+    "--image_format",
+    type=click.Choice(["png", "jpeg", "webp"]),
+    default="png",
+    show_default=True,
+    help="Encoding of the uploaded images",
+)
+@click.option(
+    "--image_quality",
+    type=click.IntRange(min=1, max=100),
+    default=85,
+    show_default=True,
+    help="With --image_format jpeg or webp, the encoding quality",
+)
+@click.option(
+    "--image_every_n",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Only every n-th image of a tag is uploaded",
+)
+@click.option("--image_max_per_tag", type=click.IntRange(min=1), help="Maximum number of images uploaded per tag")
 @click.argument("log_dir", required=True)
-def sync(project, api_token, log_dir):
+def sync(
+    project,
+    api_token,
+    workers,
+    group_by,
+    mode,
+    dry_run,
+    watch,
+    idle_timeout,
+    image_max_resolution,
+    image_format,
+    image_quality,
+    image_every_n,
+    image_max_per_tag,
+    log_dir,
+):
     if not os.path.exists(log_dir):
         # user facing
         click.echo("ERROR: Provided `log_dir` path doesn't exist", err=True)
         return
+    if dry_run and watch:
+        # user facing
+        click.echo("ERROR: `--dry_run` can't be combined with `--watch`", err=True)
+        return
 
     # We do not want to import anything if process was executed for autocompletion purposes.
+    from neptune_tensorboard import ImagePolicy
     from neptune_tensorboard.sync import DataSync
 
-    DataSync(project, api_token, log_dir).run()
+    image_policy = ImagePolicy(
+        max_resolution=image_max_resolution,
+        format=image_format,
+        quality=image_quality,
+        every_n=image_every_n,
+        max_per_tag=image_max_per_tag,
+    )
+    data_sync = DataSync(
+        project,
+        api_token,
+        log_dir,
+        workers=workers,
+        image_policy=image_policy,
+        group_by=group_by,
+        mode=mode,
+        dry_run=dry_run,
+    )
+    if watch:
+        data_sync.watch(idle_timeout=idle_timeout)
+    else:
+        data_sync.run()
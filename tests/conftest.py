@@ -0,0 +1,27 @@
+import pytest
+
+
+class FakeHandler:
+    """Stands in for a namespace handler of a run, recording what is logged to it and to its children."""
+
+    def __init__(self):
+        self.calls = []
+        self.uploads = []
+        self.children = {}
+
+    def __getitem__(self, key):
+        return self.children.setdefault(key, FakeHandler())
+
+    def append(self, value, step=None, timestamp=None, **kwargs):
+        self.calls.append((value, step, timestamp))
+
+    def extend(self, values, steps=None, timestamps=None, **kwargs):
+        self.calls.append((values, steps, timestamps))
+
+    def upload(self, file):
+        self.uploads.append((file.content, file.extension))
+
+
+@pytest.fixture
+def namespace():
+    return FakeHandler()
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from neptune_tensorboard.sync.checkpoint import (
+    CHECKPOINT_FILE_NAME,
+    Checkpoint,
+    CheckpointIndex,
+)
+
+
+def test_checkpoint_index(tmp_path):
+    event_file = str(tmp_path / "train" / "events.out.tfevents.1")
+
+    index = CheckpointIndex(str(tmp_path))
+    assert index.get(event_file) is None
+
+    index.update(event_file, Checkpoint(custom_run_id="abc", offset=0, step=None, plugin_names={}))
+    index.update(event_file, Checkpoint(custom_run_id="abc", offset=128, step=7, plugin_names={"my_text": "text"}))
+
+    # simulate a sync interrupted while writing a checkpoint
+    with open(tmp_path / CHECKPOINT_FILE_NAME, "a") as file:
+        file.write('{"path": "train/events.out.tfevents.1", "custom_run_id": "ab')
+
+    reloaded = CheckpointIndex(str(tmp_path))
+    assert reloaded.get(event_file) == Checkpoint(
+        custom_run_id="abc", offset=128, step=7, plugin_names={"my_text": "text"}
+    )
+
+    # the manifest is compacted to one line per event file
+    assert len((tmp_path / CHECKPOINT_FILE_NAME).read_text().splitlines()) == 1
+
+
+def test_checkpoint_index_in_read_only_log_dir(tmp_path, monkeypatch):
+    log_dir, cache_dir = tmp_path / "logs", tmp_path / "cache"
+    log_dir.mkdir()
+    event_file = str(log_dir / "events.out.tfevents.1")
+    monkeypatch.setenv("XDG_CACHE_HOME", str(cache_dir))
+
+    log_dir.chmod(0o555)
+    try:
+        if os.access(log_dir, os.W_OK):
+            pytest.skip("the permissions of the log directory aren't enforced for this user")
+
+        index = CheckpointIndex(str(log_dir))
+        index.update(event_file, Checkpoint(custom_run_id="abc", offset=128, step=7, plugin_names={}))
+
+        assert CheckpointIndex(str(log_dir)).get(event_file).offset == 128
+        assert list(log_dir.iterdir()) == []
+        assert len(list((cache_dir / "neptune-tensorboard" / "checkpoints").iterdir())) == 1
+    finally:
+        log_dir.chmod(0o755)
+
+
+def test_checkpoint_index_write_failures(tmp_path, capsys):
+    event_file = str(tmp_path / "events.out.tfevents.1")
+    # the manifest can't be written, whatever the permissions of the user
+    (tmp_path / "not_a_directory").touch()
+
+    index = CheckpointIndex(str(tmp_path), path=str(tmp_path / "not_a_directory" / CHECKPOINT_FILE_NAME))
+    for offset in (0, 128):
+        index.update(event_file, Checkpoint(custom_run_id="abc", offset=offset, step=None, plugin_names={}))
+
+    assert index.get(event_file).offset == 128
+    assert capsys.readouterr().out.count("Cannot save the sync progress") == 1
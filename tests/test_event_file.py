@@ -0,0 +1,103 @@
+import os
+
+import numpy as np
+from tensorboard.compat.proto.summary_pb2 import Summary
+from tensorboard.util import tensor_util
+from tensorboardX.writer import SummaryWriter
+
+from neptune_tensorboard.sync.event_file import (
+    Histogram,
+    SummaryDecoder,
+    histogram_quantiles,
+    image_extension,
+    is_valid_event_file,
+    read_events,
+    read_records,
+)
+from neptune_tensorboard.sync.projector import read_embeddings
+
+
+def _write_event_file(log_dir):
+    writer = SummaryWriter(log_dir=str(log_dir))
+    writer.add_scalar("loss", 0.5, global_step=1)
+    writer.add_scalar("loss", 0.25, global_step=2)
+    writer.add_image("zero", np.zeros((12, 12, 3)), dataformats="HWC")
+    writer.add_text("my_text", "Hello World", global_step=3)
+    writer.flush()
+    writer.close()
+    (fname,) = os.listdir(log_dir)
+    return os.path.join(log_dir, fname)
+
+
+def test_decode_event_file(tmp_path):
+    path = _write_event_file(tmp_path)
+
+    assert is_valid_event_file(path)
+
+    decoder = SummaryDecoder()
+    values = [value for event, _ in read_events(path) for value in decoder.decode(event)]
+
+    scalars = [(value.tag, value.value, value.step) for value in values if value.kind == "scalar"]
+    assert scalars == [("loss", 0.5, 1), ("loss", 0.25, 2)]
+
+    (image,) = [value for value in values if value.kind == "image"]
+    assert image.tag == "zero"
+    assert image_extension(image.value) == "png"
+
+    (text,) = [value for value in values if value.kind == "text"]
+    assert (text.tag, text.value, text.step) == ("my_text", "Hello World", 3)
+
+
+def test_truncated_record_is_skipped(tmp_path):
+    path = _write_event_file(tmp_path)
+    records = list(read_records(path))
+
+    with open(path, "rb+") as file:
+        file.truncate(records[-1][1] - 3)
+
+    assert len(list(read_records(path))) == len(records) - 1
+
+
+def test_invalid_event_file(tmp_path):
+    path = tmp_path / "events.out.tfevents.garbage"
+    path.write_bytes(b"definitely not a tfrecord file")
+
+    assert not is_valid_event_file(str(path))
+    assert not is_valid_event_file(str(tmp_path / "events.out.tfevents.missing"))
+
+
+def test_decode_other_summaries(tmp_path):
+    # NOTE: tensorboardX needs soundfile to write audio, while PyTorch uses the wave module.
+    from torch.utils.tensorboard import SummaryWriter
+
+    writer = SummaryWriter(log_dir=str(tmp_path))
+    writer.add_histogram("weights", np.arange(100), global_step=1)
+    writer.add_audio("clip", np.zeros(800), global_step=2, sample_rate=8000)
+    writer.add_pr_curve("pr", np.array([1, 0, 1, 1]), np.array([0.9, 0.2, 0.6, 0.4]), global_step=3)
+    writer.add_embedding(np.random.rand(5, 3), metadata=list("abcde"), global_step=4, tag="points")
+    # a generic tensor, as written by `tf.summary.write`
+    tensor = Summary.Value(tag="generic", tensor=tensor_util.make_tensor_proto(np.arange(3.0)))
+    writer._get_file_writer().add_summary(Summary(value=[tensor]), global_step=5)
+    writer.close()
+    (path,) = [str(path) for path in tmp_path.iterdir() if "tfevents" in path.name]
+
+    decoder = SummaryDecoder()
+    values = {value.kind: value for event, _ in read_events(path) for value in decoder.decode(event)}
+
+    quantiles = histogram_quantiles(values["histogram"].value)
+    assert (values["histogram"].tag, quantiles[0], quantiles[-1]) == ("weights", 0, 99)
+    assert values["audio"].tag == "clip"
+    assert values["audio"].value[0].startswith(b"RIFF")
+    assert (values["pr_curve"].tag, values["pr_curve"].value.shape[0]) == ("pr", 6)
+    assert (values["tensor"].tag, values["tensor"].value.tolist()) == ("generic", [0, 1, 2])
+
+    ((name, files),) = read_embeddings(str(tmp_path))
+    assert name == "points/00004"
+    assert set(files) == {"tensors", "metadata"}
+
+
+def test_histogram_quantiles():
+    histogram = Histogram(np.array([0.0, 1.0]), np.array([1.0, 2.0]), np.array([1.0, 3.0]))
+
+    assert histogram_quantiles(histogram, basis_points=(0, 2500, 5000, 10000)).tolist() == [0, 1, 4 / 3, 2]
+    assert histogram_quantiles(Histogram(np.zeros(0), np.zeros(0), np.zeros(0))) is None
@@ -1,14 +1,19 @@
 import hashlib
 import os
 import shutil
-import uuid
 import time
+import uuid
 
 import neptune
+import pytest
 import torch
 from tensorboardX.writer import SummaryWriter
 
-from neptune_tensorboard.sync.sync_impl import DataSync
+from neptune_tensorboard.integration.utils import HandlerCache
+from neptune_tensorboard.sync.sync_impl import (
+    DataSync,
+    _SeriesBatcher,
+)
 
 
 def test_exporter():
@@ -47,3 +52,374 @@ def test_exporter():
         assert run.exists("tensorboard/text")
 
     shutil.rmtree(log_dir)
+
+
+def test_series_batcher(namespace):
+    batcher = _SeriesBatcher(HandlerCache(namespace), "scalar", "loss", batch_size=2)
+    batcher.append(0.1, 1, 10.0)
+    batcher.append(0.2, 2, 11.0)
+    batcher.append(0.3, 3, 12.0)
+    # steps are not increasing anymore, e.g. after a restart
+    batcher.append(0.4, 0, 13.0)
+    batcher.flush()
+
+    assert namespace["scalar"]["loss"].calls == [
+        ([0.1, 0.2], [1, 2], [10.0, 11.0]),
+        ([0.3, 0.4], [3, 3.5], [12.0, 13.0]),
+    ]
+
+
+def test_series_batcher_repeated_steps(namespace):
+    batcher = _SeriesBatcher(HandlerCache(namespace), "scalar", "loss", batch_size=1000)
+    for value in range(2000):
+        batcher.append(float(value), 0, 10.0)
+    batcher.flush()
+
+    assert [len(values) for values, _, _ in namespace["scalar"]["loss"].calls] == [1000, 1000]
+
+
+def test_run_export_other_summaries(tmp_path, capsys):
+    import numpy as np
+    from tensorboard.compat.proto.summary_pb2 import Summary
+    from tensorboard.util import tensor_util
+    from torch.utils.tensorboard import SummaryWriter as TorchSummaryWriter
+
+    from neptune_tensorboard.sync.checkpoint import (
+        Checkpoint,
+        CheckpointIndex,
+    )
+    from neptune_tensorboard.sync.sync_impl import _RunExport
+
+    writer = TorchSummaryWriter(log_dir=str(tmp_path))
+    for step in range(3):
+        writer.add_histogram("weights", torch.randn(100), global_step=step)
+    # clips logged at the same step don't overwrite each other
+    writer.add_audio("clip", torch.zeros(800), global_step=1, sample_rate=8000)
+    writer.add_audio("clip", torch.ones(800), global_step=1, sample_rate=8000)
+    writer.add_pr_curve("pr", torch.tensor([1, 0, 1, 1]), torch.tensor([0.9, 0.2, 0.6, 0.4]), global_step=2)
+    writer.add_embedding(torch.rand(5, 3), metadata=list("abcde"), global_step=3, tag="points")
+    for step in range(2):
+        tensors = [
+            Summary.Value(tag="generic", tensor=tensor_util.make_tensor_proto(np.float32(step))),
+            Summary.Value(tag="matrix", tensor=tensor_util.make_tensor_proto(np.eye(2))),
+        ]
+        writer._get_file_writer().add_summary(Summary(value=tensors), global_step=step)
+    writer.close()
+    (path,) = [str(path) for path in tmp_path.iterdir() if "tfevents" in path.name]
+
+    with neptune.init_run(mode="debug") as run:
+        checkpoint = Checkpoint(custom_run_id="id", offset=0, step=None, plugin_names={})
+        export = _RunExport(path, run, checkpoint, CheckpointIndex(str(tmp_path)))
+        export.export_new_events()
+        assert export._export_embeddings()
+        # the projector config didn't change since
+        assert not export._export_embeddings()
+        run.sync()
+
+        for name in ("min", "p50", "max"):
+            assert run.exists(f"tensorboard/histograms/weights/{name}")
+        assert run.exists("tensorboard/audio/clip/1")
+        assert run.exists("tensorboard/audio/clip/1_1")
+        assert run.exists("tensorboard/tensors/generic")
+        assert not run.exists("tensorboard/tensors/matrix")
+        assert run.exists("tensorboard/pr_curves/pr/average_precision")
+        assert run.exists("tensorboard/pr_curves/pr/curve")
+        assert run.exists("tensorboard/embeddings/points/00003/tensors")
+
+    # the tensors which can't be exported are only reported once per tag
+    assert capsys.readouterr().out.count("Skipping the tensors of 'matrix'") == 1
+
+
+def test_run_export_bounds_pending_points(tmp_path, monkeypatch):
+    from neptune.handler import Handler
+
+    from neptune_tensorboard.sync import sync_impl
+    from neptune_tensorboard.sync.checkpoint import (
+        Checkpoint,
+        CheckpointIndex,
+    )
+
+    writer = SummaryWriter(log_dir=str(tmp_path))
+    for step in range(10):
+        for tag in ("a", "b"):
+            writer.add_scalar(tag, step, global_step=step)
+    writer.close()
+    (path,) = [str(path) for path in tmp_path.iterdir() if "tfevents" in path.name]
+
+    extended = []
+    monkeypatch.setattr(Handler, "extend", lambda self, values, **kwargs: extended.append(len(values)))
+    monkeypatch.setattr(sync_impl, "MAX_PENDING_POINTS", 8)
+
+    with neptune.init_run(mode="debug") as run:
+        checkpoint = Checkpoint(custom_run_id="id", offset=0, step=None, plugin_names={})
+        export = sync_impl._RunExport(path, run, checkpoint, CheckpointIndex(str(tmp_path)))
+        export.export_new_events()
+
+    # both series are uploaded every 8 points, and the rest at the end
+    assert extended == [4, 4, 4, 4, 2, 2]
+
+
+def test_run_export_image_batches(tmp_path, monkeypatch):
+    import numpy as np
+    import tensorflow as tf
+    from neptune.handler import Handler
+
+    from neptune_tensorboard.sync.checkpoint import (
+        Checkpoint,
+        CheckpointIndex,
+    )
+    from neptune_tensorboard.sync.sync_impl import _RunExport
+
+    with tf.summary.create_file_writer(str(tmp_path)).as_default():
+        for step in (1, 2):
+            images = np.stack([np.full((4, 4, 3), step / 10), np.full((4, 4, 3), step / 10 + 0.05)])
+            tf.summary.image("batch", images, step=step, max_outputs=2)
+    (path,) = [str(path) for path in tmp_path.iterdir() if "tfevents" in path.name]
+
+    steps = []
+    monkeypatch.setattr(Handler, "extend", lambda self, values, **kwargs: steps.append(kwargs["steps"]))
+
+    with neptune.init_run(mode="debug") as run:
+        checkpoint = Checkpoint(custom_run_id="id", offset=0, step=None, plugin_names={})
+        export = _RunExport(path, run, checkpoint, CheckpointIndex(str(tmp_path)))
+        export.export_new_events()
+
+    # the images of a summary are uploaded together, each with a step of its own
+    assert steps == [[1.0, 1.5], [2.0, 2.5]]
+
+
+def test_data_sync_groups_by_run_dir(tmp_path, monkeypatch):
+    from neptune_tensorboard.sync import sync_impl
+
+    def write(log_dir, value):
+        writer = SummaryWriter(log_dir=str(log_dir), filename_suffix=f".{value}")
+        writer.add_scalar("loss", value, global_step=1)
+        writer.close()
+        time.sleep(0.01)
+
+    write(tmp_path / "experiment" / "train", 0.5)
+    write(tmp_path / "experiment" / "validation", 0.4)
+    # restarted
+    write(tmp_path / "experiment" / "train", 0.3)
+    write(tmp_path / "other", 0.2)
+
+    custom_run_ids, exports = [], []
+    init_run = sync_impl.DataSync._init_run
+    monkeypatch.setattr(
+        sync_impl.DataSync, "_init_run", lambda self, run_id: custom_run_ids.append(run_id) or init_run(self, run_id)
+    )
+
+    class _RecordedExport(sync_impl._RunExport):
+        def __init__(self, path, run, checkpoint, checkpoints, namespace, **kwargs):
+            exports.append((os.path.relpath(os.path.dirname(path), tmp_path), namespace.name))
+            super().__init__(path, run, checkpoint, checkpoints, namespace, **kwargs)
+
+    monkeypatch.setattr(sync_impl, "_RunExport", _RecordedExport)
+
+    sync_impl.DataSync(project=None, api_token=None, path=str(tmp_path), group_by="run_dir", mode="debug").run()
+
+    assert sorted(custom_run_ids) == sorted(
+        sync_impl.compute_md5_hash(os.path.join(str(tmp_path), name)) for name in ("experiment", "other")
+    )
+    # the files of a run directory are exported in the order they were written in
+    experiment_exports = [export for export in exports if export[0].startswith("experiment")]
+    assert experiment_exports == [
+        (os.path.join("experiment", "train"), "tensorboard/train"),
+        (os.path.join("experiment", "validation"), "tensorboard/validation"),
+        (os.path.join("experiment", "train"), "tensorboard/train"),
+    ]
+    assert ("other", "tensorboard") in exports
+
+
+def test_data_sync_run_dir_keeps_steps_increasing(tmp_path, monkeypatch):
+    from neptune.handler import Handler
+
+    from neptune_tensorboard.sync import sync_impl
+
+    for suffix in ("first", "restarted"):
+        writer = SummaryWriter(log_dir=str(tmp_path / "experiment"), filename_suffix=f".{suffix}")
+        for step in (1, 2):
+            writer.add_text("note", f"{suffix} {step}", global_step=step)
+        writer.close()
+        time.sleep(0.01)
+
+    appended = []
+    monkeypatch.setattr(Handler, "append", lambda self, value, **kwargs: appended.append((value, kwargs["step"])))
+
+    sync_impl.DataSync(project=None, api_token=None, path=str(tmp_path), group_by="run_dir", mode="debug").run()
+
+    # the restarted file repeats the steps its run already holds, so it continues after them
+    assert appended == [("first 1", 1.0), ("first 2", 2.0), ("restarted 1", 2.5), ("restarted 2", 3.0)]
+
+
+def test_data_sync_resumes_the_steps_of_a_run(tmp_path, monkeypatch):
+    from neptune.handler import Handler
+
+    from neptune_tensorboard.sync import sync_impl
+
+    appended = []
+    monkeypatch.setattr(Handler, "append", lambda self, value, **kwargs: appended.append((value, kwargs["step"])))
+
+    for suffix in ("first", "restarted"):
+        writer = SummaryWriter(log_dir=str(tmp_path / "experiment"), filename_suffix=f".{suffix}")
+        for step in (1, 2):
+            writer.add_text("note", f"{suffix} {step}", global_step=step)
+        writer.close()
+        # the restarted file is only exported by the next sync, with a new run handle
+        sync_impl.DataSync(project=None, api_token=None, path=str(tmp_path), group_by="run_dir", mode="debug").run()
+        time.sleep(0.01)
+
+    assert appended == [("first 1", 1.0), ("first 2", 2.0), ("restarted 1", 2.5), ("restarted 2", 3.0)]
+
+
+def test_data_sync_exports_the_embeddings_once(tmp_path, monkeypatch):
+    from neptune.handler import Handler
+
+    from neptune_tensorboard.sync import sync_impl
+
+    uploaded = []
+    monkeypatch.setattr(Handler, "upload", lambda self, value, **kwargs: uploaded.append(self._path))
+
+    writer = SummaryWriter(log_dir=str(tmp_path))
+    writer.add_embedding(torch.rand(5, 3), global_step=1, tag="points")
+    writer.add_scalar("loss", 0.5, global_step=1)
+    writer.flush()
+    sync_impl.DataSync(project=None, api_token=None, path=str(tmp_path), mode="debug").run()
+
+    # the next sync only exports the new events
+    writer.add_scalar("loss", 0.25, global_step=2)
+    writer.close()
+    sync_impl.DataSync(project=None, api_token=None, path=str(tmp_path), mode="debug").run()
+
+    assert uploaded == ["tensorboard/embeddings/points/00001/tensors"]
+
+
+def test_data_sync_samples_the_images_of_a_run_together(tmp_path, monkeypatch):
+    from neptune.handler import Handler
+
+    from neptune_tensorboard import ImagePolicy
+    from neptune_tensorboard.sync import sync_impl
+
+    uploaded = []
+    monkeypatch.setattr(Handler, "extend", lambda self, values, **kwargs: uploaded.extend(values))
+
+    for suffix in ("first", "restarted"):
+        writer = SummaryWriter(log_dir=str(tmp_path / "experiment"), filename_suffix=f".{suffix}")
+        for step in (1, 2):
+            writer.add_image("noise", torch.rand(12, 12, 3), global_step=step, dataformats="HWC")
+        writer.close()
+        sync_impl.DataSync(
+            project=None,
+            api_token=None,
+            path=str(tmp_path),
+            image_policy=ImagePolicy(max_per_tag=3),
+            group_by="run_dir",
+            mode="debug",
+        ).run()
+        time.sleep(0.01)
+
+    # the limit applies to the run, across its files and the syncs
+    assert len(uploaded) == 3
+
+
+def test_data_sync_caches_the_created_runs(tmp_path, monkeypatch):
+    import json
+
+    from neptune_tensorboard.sync import sync_impl
+
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.delenv("NEPTUNE_MODE", raising=False)
+    monkeypatch.setattr(sync_impl.neptune, "init_run", lambda **kwargs: object())
+    data_sync = sync_impl.DataSync(project="workspace/project", api_token=None, path=str(tmp_path))
+    cache_path = data_sync._run_ids_cache_path()
+    os.makedirs(os.path.dirname(cache_path))
+
+    # a cache of the wrong shape is stale
+    for cache in ({}, [], {"fetched_at": "now", "custom_run_ids": 1}):
+        with open(cache_path, "w") as file:
+            json.dump(cache, file)
+        assert data_sync._load_cached_run_ids(cache_path) is None
+
+    with open(cache_path, "w") as file:
+        json.dump({"fetched_at": 100.0, "custom_run_ids": ["a"]}, file)
+    monkeypatch.setattr(sync_impl.time, "time", lambda: 200.0)
+    data_sync._prepare()
+    data_sync._init_run("b")
+
+    # the runs created within the TTL are skipped by the next sync, even without checkpoints
+    assert data_sync._load_cached_run_ids(cache_path) == ({"a", "b"}, 100.0)
+
+
+def test_data_sync_shares_the_backend(tmp_path, monkeypatch):
+    from neptune.internal.backends.neptune_backend_mock import NeptuneBackendMock
+    from neptune.metadata_containers import metadata_container
+
+    from neptune_tensorboard.sync import sync_impl
+
+    for index in range(4):
+        writer = SummaryWriter(log_dir=str(tmp_path / f"run_{index}"))
+        writer.add_scalar("loss", index, global_step=1)
+        writer.close()
+
+    handshakes, closed = [], []
+
+    class StandInBackend(NeptuneBackendMock):
+        def __init__(self):
+            handshakes.append(self)
+            super().__init__()
+
+        def close(self):
+            closed.append(self)
+
+    monkeypatch.setattr(metadata_container, "get_backend", lambda mode, api_token=None, proxies=None: StandInBackend())
+    monkeypatch.setattr(sync_impl.DataSync, "_get_existing_neptune_custom_run_ids", lambda self: set())
+
+    sync_impl.DataSync(project=None, api_token=None, path=str(tmp_path), workers=2).run()
+
+    assert len(handshakes) == 1
+    assert closed == handshakes
+
+
+def test_data_sync_dry_run(tmp_path, monkeypatch, capsys):
+    from neptune_tensorboard.sync import sync_impl
+    from neptune_tensorboard.sync.checkpoint import CHECKPOINT_FILE_NAME
+
+    writer = SummaryWriter(log_dir=str(tmp_path))
+    for step in range(3):
+        writer.add_scalar("loss", 1 / (step + 1), global_step=step)
+    writer.add_text("note", "Hello World")
+    writer.close()
+
+    fail = lambda *args, **kwargs: pytest.fail("a dry run must not connect to Neptune")  # noqa: E731
+    monkeypatch.setattr(neptune, "init_run", fail)
+    monkeypatch.setattr(neptune, "init_project", fail)
+
+    sync_impl.DataSync(project=None, api_token=None, path=str(tmp_path), dry_run=True).run()
+
+    output = capsys.readouterr().out
+    assert "would be exported" in output
+    assert "Planned 1 event files" in output
+    assert "events/s" in output
+    lines = {line.split()[0]: line.split()[-1] for line in output.splitlines() if line}
+    assert lines["scalar"] == "3"
+    assert lines["text"] == "1"
+    # tensorboard_path, one extend for the scalars and one append for the text
+    assert output.splitlines()[-1].split() == ["projected", "operations", "3"]
+    assert not (tmp_path / CHECKPOINT_FILE_NAME).exists()
+
+
+def test_data_sync_offline_mode(tmp_path, monkeypatch, capsys):
+    from neptune_tensorboard.sync import sync_impl
+
+    log_dir = tmp_path / "logs"
+    writer = SummaryWriter(log_dir=str(log_dir))
+    writer.add_scalar("loss", 0.5, global_step=1)
+    writer.close()
+    # the offline runs are stored in the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(neptune, "init_project", lambda *args, **kwargs: pytest.fail("offline runs have no project"))
+
+    sync_impl.DataSync(project=None, api_token=None, path=str(log_dir), mode="offline").run()
+
+    assert "Exported 1 event files" in capsys.readouterr().out
+    assert os.listdir(tmp_path / ".neptune" / "offline")
@@ -0,0 +1,74 @@
+import pytest
+import torch
+from torch.utils.tensorboard._pytorch_graph import graph
+
+from neptune_tensorboard.integration.graphs import (
+    GraphRenderer,
+    graph_def_digraph,
+    graph_def_signature,
+)
+from neptune_tensorboard.integration.utils import HandlerCache
+
+
+class FakeDigraph:
+    source = "digraph { a -> b }"
+
+    def __init__(self):
+        self.renders = 0
+
+    def pipe(self, format):
+        self.renders += 1
+        return b"png of " + self.source.encode()
+
+
+class FailingDigraph(FakeDigraph):
+    def pipe(self, format):
+        raise RuntimeError("dot not found")
+
+
+def test_graph_def_signature_ignores_weights():
+    model = torch.nn.Linear(3, 3)
+    graph_def = graph(model, torch.zeros(2, 3))[0]
+    signature = graph_def_signature(graph_def)
+
+    with torch.no_grad():
+        model.weight += 1
+    assert graph_def_signature(graph(model, torch.zeros(2, 3))[0]) == signature
+
+    assert graph_def_signature(graph(model, torch.zeros(4, 3))[0]) != signature
+    assert graph_def_signature(graph(torch.nn.Linear(3, 4), torch.zeros(2, 3))[0]) != signature
+    assert "Linear" in graph_def_digraph(graph_def).source
+
+
+def test_graph_renderer(namespace):
+    graph = FakeDigraph()
+
+    handlers = HandlerCache(namespace["png"])
+
+    renderer = GraphRenderer()
+    assert renderer.is_new(b"model")
+    renderer.upload(handlers, graph, b"model")
+    assert not renderer.is_new(b"model")
+    renderer.upload(handlers, graph)
+    renderer.flush()
+    assert graph.renders == 2
+    # the second rendering is identical, so it isn't uploaded again
+    assert namespace["png"]["graph"].uploads == [(b"png of digraph { a -> b }", "png")]
+
+    GraphRenderer("dot").upload(HandlerCache(namespace["dot"]), graph)
+    assert namespace["dot"]["graph"].uploads == [(b"digraph { a -> b }", "dot")]
+
+
+def test_graph_renderer_retries_failed_renderings(namespace):
+    handlers = HandlerCache(namespace)
+    renderer = GraphRenderer()
+
+    renderer.upload(handlers, FailingDigraph(), b"model")
+    with pytest.warns(UserWarning, match="dot not found"):
+        renderer.flush()
+    assert renderer.is_new(b"model")
+
+    renderer.upload(handlers, FakeDigraph(), b"model")
+    renderer.flush()
+    assert not renderer.is_new(b"model")
+    assert namespace["graph"].uploads == [(b"png of digraph { a -> b }", "png")]
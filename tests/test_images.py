@@ -0,0 +1,136 @@
+import io
+import tracemalloc
+
+import numpy as np
+import torch
+from PIL import Image
+
+from neptune_tensorboard.integration.images import (
+    ImageConverter,
+    ImagePolicy,
+    encode_images,
+    image_as_batch,
+    make_grid,
+    to_uint8_batch,
+)
+from neptune_tensorboard.integration.utils import ContentCache
+
+
+def test_to_uint8_batch_scales_each_image():
+    images = torch.stack([torch.full((3, 2, 2), 0.5), torch.full((3, 2, 2), 200.0)])
+
+    batch = to_uint8_batch(images, dataformats="NCHW")
+
+    assert batch.shape == (2, 2, 2, 3)
+    assert batch.dtype == np.uint8
+    assert batch[0].max() == batch[0].min() == 127
+    assert batch[1].max() == batch[1].min() == 200
+
+
+def test_image_as_batch_does_not_copy():
+    image = np.random.rand(3, 8, 6)
+
+    batch, dataformats = image_as_batch(image, "CHW")
+    assert (batch.shape, dataformats) == ((1, 3, 8, 6), "NCHW")
+    assert np.shares_memory(batch, image)
+
+    tensor = torch.rand(8, 6)
+    batch, dataformats = image_as_batch(tensor, "WH")
+    assert (batch.shape, dataformats) == ((1, 6, 8, 1), "NHWC")
+    assert np.shares_memory(batch, tensor.numpy())
+
+
+def test_to_uint8_batch_copies_once():
+    images = np.random.rand(4, 3, 128, 128).astype(np.float32)
+    size = images.size
+
+    tracemalloc.start()
+    try:
+        batch = to_uint8_batch(images, dataformats="NCHW")
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert batch.flags.c_contiguous
+    # a single uint8 copy of the images, instead of float ones
+    assert peak < 1.5 * size
+    assert np.array_equal(batch, (images.transpose(0, 2, 3, 1) * 255).astype(np.uint8))
+
+
+def test_make_grid():
+    images = np.ones((5, 4, 4, 1), dtype=np.uint8)
+
+    grid = make_grid(images, padding=1)
+
+    # 5 images fit in 3 columns and 2 rows
+    assert grid.shape == (2 * 5 + 1, 3 * 5 + 1, 1)
+    assert grid.sum() == 5 * 4 * 4
+
+
+def test_encode_images_keeps_order():
+    images = np.arange(4, dtype=np.uint8).reshape(4, 1, 1, 1).repeat(8, axis=1).repeat(8, axis=2)
+
+    encoded = encode_images(images, ImagePolicy())
+
+    assert {extension for _, extension in encoded} == {"png"}
+    decoded = [np.asarray(Image.open(io.BytesIO(content))) for content, _ in encoded]
+    assert [image.shape for image in decoded] == [(8, 8)] * 4
+    assert [int(image[0, 0]) for image in decoded] == [0, 1, 2, 3]
+
+
+def test_image_policy_downscales_and_reencodes():
+    policy = ImagePolicy(max_resolution=16, format="jpeg", quality=50)
+
+    content, extension = policy.encode(Image.new("RGBA", (64, 32)))
+
+    assert extension == "jpeg"
+    with Image.open(io.BytesIO(content)) as image:
+        assert (image.format, image.size) == ("JPEG", (16, 8))
+
+
+def test_image_converter_samples_per_tag():
+    converter = ImageConverter(ImagePolicy(every_n=2, max_per_tag=3))
+
+    assert converter.sample("a", 3) == [0, 2]
+    assert converter.sample("b", 1) == [0]
+    assert converter.sample("a", 4) == [1]
+    assert converter.sample("a", 4) == []
+    assert len(converter.convert("b", np.zeros((4, 8, 8, 3)))) == 2
+
+
+def test_image_converter_reuses_repeated_images():
+    cache = ContentCache()
+    converter = ImageConverter(cache=cache)
+    images = np.random.rand(2, 3, 8, 8)
+
+    first = converter.convert("a", images, dataformats="NCHW")
+    assert len(first) == 2
+    # identical to the previous payload of the tag
+    assert converter.convert("a", images, dataformats="NCHW") == []
+
+    # the encoded images are reused for other tags
+    other = ImageConverter(cache=cache).convert("b", images, dataformats="NCHW")
+    assert [image.content for image in other] == [image.content for image in first]
+
+
+def test_image_converter_skips_earlier_uploads():
+    cache = ContentCache()
+    converter = ImageConverter(cache=cache)
+    first, second = np.zeros((1, 8, 8, 3)), np.ones((1, 8, 8, 3))
+
+    assert len(converter.convert("a", first)) == 1
+    assert len(converter.convert("a", second)) == 1
+    # already in the series of the tag, even if it isn't the last image of it
+    assert converter.convert("a", first) == []
+    # an image which replaces the previous one has to be uploaded again
+    assert len(converter.convert("single", first, series=False)) == 1
+    assert len(converter.convert("single", second, series=False)) == 1
+    assert len(converter.convert("single", first, series=False)) == 1
+
+    # already encoded images are looked up under the default policy as well
+    encoded = [converter.convert("b", image)[0].content for image in (first, second)]
+    assert converter.convert_encoded("c", encoded[0], "png") is not None
+    assert converter.convert_encoded("c", encoded[1], "png") is not None
+    assert converter.convert_encoded("c", encoded[0], "png") is None
+    # a converter sharing the cache may upload to another run
+    assert ImageConverter(cache=cache).convert_encoded("c", encoded[0], "png") is not None
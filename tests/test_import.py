@@ -0,0 +1,12 @@
+import subprocess
+import sys
+
+
+def test_import_does_not_import_frameworks():
+    code = (
+        "import sys, neptune_tensorboard\n"
+        "print([name for name in ('tensorflow', 'torch', 'tensorboardX') if name in sys.modules])"
+    )
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+
+    assert output.strip() == "[]"
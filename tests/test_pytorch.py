@@ -1,6 +1,11 @@
+import subprocess
+import sys
+
 import matplotlib.pyplot as plt
 import neptune
+import pytest
 import torch
+from neptune.handler import Handler
 from torch.utils.tensorboard import SummaryWriter
 
 import neptune_tensorboard
@@ -52,3 +57,132 @@ def test_pytorch():
             assert run.exists("tensorboard/metrics/loss")
             assert run.exists("tensorboard/figure/my_figure")
             assert run.exists("tensorboard/text/my_text")
+
+
+def test_pytorch_async():
+    with neptune.Run() as run:
+
+        with neptune_tensorboard.enable_tensorboard_logging_ctx(run, async_=True, max_queue=2):
+
+            writer = SummaryWriter()
+
+            for step in range(10):
+                writer.add_scalar("batch_loss", 1 / (step + 1), global_step=step)
+            writer.add_images("zeros", torch.zeros(4, 12, 12, 3), dataformats="NHWC")
+            writer.add_text("my_text", "Hello World")
+
+        run.sync()
+
+        assert run.exists("tensorboard/scalar/batch_loss")
+        assert run.exists("tensorboard/images/zeros")
+        assert run.exists("tensorboard/text/my_text")
+
+
+def test_pytorch_steps(monkeypatch):
+    # NOTE: The debug mode doesn't store steps, so the calls made to the handlers are checked instead.
+    calls = []
+    monkeypatch.setattr(Handler, "extend", lambda self, values, **kwargs: calls.append((self._path, values, kwargs)))
+    monkeypatch.setattr(Handler, "append", lambda self, value, **kwargs: calls.append((self._path, value, kwargs)))
+
+    with neptune.Run() as run:
+
+        with neptune_tensorboard.enable_tensorboard_logging_ctx(run):
+
+            writer = SummaryWriter()
+
+            for step in (10, 20):
+                writer.add_scalar("batch_loss", 1 / step, global_step=step, walltime=1000.0 + step)
+                writer.add_text("my_text", f"Step {step}", global_step=step, walltime=1000.0 + step)
+            for step in (1, 2, 3):
+                writer.add_images("batch", torch.full((2, 4, 4, 3), step / 10), global_step=step, dataformats="NHWC")
+
+    # the images of a batch are logged at the step of their call, each with a step of its own
+    image_steps = [kwargs["steps"] for path, _, kwargs in calls if path == "tensorboard/images/batch"]
+    assert image_steps == [[1.0, 1.5], [2.0, 2.5], [3.0, 3.5]]
+    calls = [call for call in calls if call[0] != "tensorboard/images/batch"]
+    assert sorted(calls) == [
+        ("tensorboard/scalar/batch_loss", [0.1, 0.05], {"steps": [10.0, 20.0], "timestamps": [1010.0, 1020.0]}),
+        ("tensorboard/text/my_text", "Step 10", {"step": 10.0, "timestamp": 1010.0}),
+        ("tensorboard/text/my_text", "Step 20", {"step": 20.0, "timestamp": 1020.0}),
+    ]
+
+
+def test_pytorch_instrumentation(capsys):
+    with neptune.Run() as run:
+
+        with neptune_tensorboard.enable_tensorboard_logging_ctx(run, instrument=True):
+
+            writer = SummaryWriter()
+
+            for step in range(3):
+                writer.add_scalar("batch_loss", 1 / (step + 1), global_step=step)
+            writer.add_images("zeros", torch.zeros(4, 12, 12, 3), dataformats="NHWC")
+
+        run.sync()
+
+        namespace = "monitoring/neptune_tensorboard/pytorch"
+        assert run[f"{namespace}/add_scalar/calls"].fetch_last() == 3
+        assert run[f"{namespace}/add_images/bytes_converted"].fetch_last() > 0
+        assert run.exists(f"{namespace}/add_images/latency_histogram")
+        assert "add_scalar" in capsys.readouterr().out
+
+
+def test_pytorch_not_selected():
+    add_scalar = SummaryWriter.add_scalar
+    with neptune.Run() as run:
+        with neptune_tensorboard.enable_tensorboard_logging_ctx(run, frameworks=["tensorboardx"]):
+            assert SummaryWriter.add_scalar is add_scalar
+
+        with pytest.raises(ValueError):
+            with neptune_tensorboard.enable_tensorboard_logging_ctx(run, frameworks=["torch"]):
+                pass
+
+
+def test_pytorch_imported_after_enabling(tmp_path):
+    # NOTE: Runs in a fresh interpreter, as torch is already imported by this module.
+    code = f"""
+import sys
+import neptune
+from neptune.handler import Handler
+from neptune_tensorboard import enable_tensorboard_logging
+
+calls = []
+Handler.extend = lambda self, values, steps=None, **kwargs: calls.append((self._path, list(values), steps))
+
+run = neptune.init_run(mode="debug")
+enable_tensorboard_logging(run)
+assert "torch" not in sys.modules
+
+from torch.utils.tensorboard import SummaryWriter
+
+SummaryWriter({str(tmp_path)!r}).add_scalar("loss", 0.5, global_step=1)
+run.wait()
+print(calls)
+run.stop()
+"""
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+
+    assert "[('tensorboard/scalar/loss', [0.5], [1.0])]" in output.splitlines()
+
+
+def test_pytorch_async_enabled_twice(tmp_path):
+    # NOTE: Runs in a fresh interpreter, as `enable_tensorboard_logging()` patches torch for good.
+    code = f"""
+import threading
+import neptune
+from torch.utils.tensorboard import SummaryWriter
+from neptune_tensorboard import enable_tensorboard_logging
+
+run = neptune.init_run(mode="debug")
+enable_tensorboard_logging(run, async_=True)
+enable_tensorboard_logging(run, async_=True)
+
+SummaryWriter({str(tmp_path)!r}).add_scalar("loss", 0.5, global_step=1)
+run.wait()
+print("hook threads:", sum(thread.name == "neptune-tensorboard-hooks" for thread in threading.enumerate()))
+run.stop()
+"""
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+
+    # the second call finds torch already patched, so it doesn't start a thread of its own
+    assert "hook threads: 1" in output.splitlines()
@@ -0,0 +1,209 @@
+import json
+import math
+import threading
+
+import numpy as np
+import torch
+
+from neptune_tensorboard.integration.sampling import (
+    SamplingRule,
+    TagSampler,
+)
+from neptune_tensorboard.integration.utils import (
+    AsyncHookDispatcher,
+    ContentCache,
+    HandlerCache,
+    ScalarBuffer,
+    SeriesSteps,
+    snapshot,
+)
+
+
+def test_snapshot_copies_tensors():
+    tensor, array = torch.zeros(2), np.zeros(2)
+    copied_tensor, (copied_array,) = snapshot(tensor), snapshot([array])
+
+    tensor += 1
+    array += 1
+
+    assert copied_tensor.tolist() == [0, 0]
+    assert copied_array.tolist() == [0, 0]
+
+
+def test_dispatcher_drop_oldest():
+    logged, release = [], threading.Event()
+
+    def hook(value):
+        release.wait()
+        logged.append(value)
+
+    dispatcher = AsyncHookDispatcher(max_queue=2, backpressure="drop_oldest")
+    dispatcher.submit(hook, (0,), {})
+    # wait for the worker to pick up the first call
+    while dispatcher._queue:
+        pass
+    for value in range(1, 5):
+        dispatcher.submit(hook, (value,), {})
+    release.set()
+    dispatcher.close()
+
+    assert logged == [0, 3, 4]
+
+
+def test_scalar_buffer(namespace):
+    buffer = ScalarBuffer(HandlerCache(namespace), flush_size=3, flush_interval=3600)
+
+    buffer.append("loss", 0.5, step=1, timestamp=10.0)
+    buffer.append("loss", torch.tensor(0.25), step=2, timestamp=11.0)
+    buffer.append("acc", 0.1)
+    assert namespace["scalar"]["loss"].calls == []
+
+    buffer.append("loss", 0.125, step=3, timestamp=12.0)
+    assert namespace["scalar"]["loss"].calls == [([0.5, 0.25, 0.125], [1, 2, 3], [10.0, 11.0, 12.0])]
+
+    buffer.flush()
+    ((values, steps, _),) = namespace["scalar"]["acc"].calls
+    assert (values, steps) == ([0.1], None)
+
+
+def test_scalar_buffer_keeps_steps_after_repeated_ones(namespace):
+    buffer = ScalarBuffer(HandlerCache(namespace), flush_size=2, flush_interval=3600)
+
+    for value, step in enumerate([1, 2, 3, 3, 4, 5]):
+        buffer.append("loss", float(value), step=step, timestamp=10.0)
+
+    assert [steps for _, steps, _ in namespace["scalar"]["loss"].calls] == [[1, 2], [3, 3.5], [4, 5]]
+
+
+def test_scalar_buffer_mixed_steps(namespace):
+    buffer = ScalarBuffer(HandlerCache(namespace), flush_interval=3600)
+
+    for value, step in enumerate([1, 2, 3, None, 5]):
+        buffer.append("loss", float(value), step=step, timestamp=10.0)
+    buffer.flush()
+
+    # the scalar logged without a step doesn't make the others lose theirs
+    assert namespace["scalar"]["loss"].calls == [([0.0, 1.0, 2.0, 3.0, 4.0], [1, 2, 3, 3.5, 5], [10.0] * 5)]
+
+
+def test_series_steps():
+    steps = SeriesSteps()
+
+    assert steps.resolve([1.0, 2.0]) == [1.0, 2.0]
+    assert steps.resolve([3.0, 3.0]) == [3.0, 3.5]
+    assert steps.resolve([4.0, 5.0]) == [4.0, 5.0]
+    assert steps.resolve([6.0, math.nan, 7.0]) == [6.0, 6.5, 7.0]
+    # e.g. a restart, the repeated steps follow the last one until the new steps catch up
+    assert steps.resolve([1.0, 2.0, 9.0]) == [7.5, 8.0, 9.0]
+    assert steps.last_step == 9
+
+    steps = SeriesSteps()
+    # Neptune starts the implicit steps from 0
+    assert steps.resolve([None, None]) is None
+    assert steps.resolve([1.0]) == [1.5]
+    assert steps.resolve([None, 5.0]) == [2.0, 5.0]
+
+    steps = SeriesSteps()
+    # a repeated step doesn't change the steps of the rest of the batch
+    assert steps.resolve([1, 2, 3, 3] + list(range(4, 21))) == [1, 2, 3, 3.5] + list(range(4, 21))
+    # nor the steps logged after it
+    assert steps.resolve([20, 21, 22]) == [20.5, 21, 22]
+
+
+def test_scalar_buffer_sampling(namespace):
+    sampler = TagSampler([SamplingRule("grad/*", every_n=2, aggregate=True)])
+    buffer = ScalarBuffer(HandlerCache(namespace), flush_interval=3600, sampler=sampler)
+
+    for step in range(5):
+        buffer.append("grad/norm", float(step), step=step, timestamp=10.0)
+        buffer.append("loss", float(step), step=step, timestamp=10.0)
+    buffer.flush()
+
+    assert namespace["scalar"]["grad/norm"].calls == [([0.0, 2.0, 4.0], [0, 2, 4], [10.0] * 3)]
+    assert namespace["scalar"]["loss"].calls == [([0.0, 1.0, 2.0, 3.0, 4.0], [0, 1, 2, 3, 4], [10.0] * 5)]
+    assert namespace["scalar_window"]["grad/norm/min"].calls == [([0.0, 1.0, 3.0], [0, 2, 4], [10.0] * 3)]
+    assert namespace["scalar_window"]["grad/norm/max"].calls == [([0.0, 2.0, 4.0], [0, 2, 4], [10.0] * 3)]
+
+
+def test_tag_sampler_min_interval():
+    sampler = TagSampler([SamplingRule("text/*", min_interval=3600)])
+
+    assert sampler.sample("text", "text/notes") == {}
+    assert sampler.sample("text", "text/notes") is None
+    assert sampler.sample("text", "other") == {}
+    assert sampler.sample("text", "other") == {}
+
+
+def test_handler_cache_evicts_least_recently_used(namespace):
+    handlers = HandlerCache(namespace, maxsize=2)
+
+    loss = handlers.get("scalar", "loss")
+    handlers.get("scalar", "acc")
+    assert handlers.get("scalar", "loss") is loss
+
+    handlers.get("text", "notes")
+    assert list(handlers._handlers) == [("scalar", "loss"), ("text", "notes")]
+
+
+def test_handler_cache_append_keeps_steps_increasing(namespace):
+    handlers = HandlerCache(namespace)
+
+    for value, step in enumerate([1, 2, 2, 3]):
+        handlers.append("text", "notes", value, step=step, timestamp=10.0)
+
+    assert namespace["text"]["notes"].calls == [(0, 1, 10.0), (1, 2, 10.0), (2, 2.5, 10.0), (3, 3, 10.0)]
+
+    # Neptune assigns the step 4 to a point without one, so the step 4 can't be reused
+    handlers.append("text", "notes", 4)
+    handlers.append("text", "notes", 5, step=4, timestamp=10.0)
+    assert namespace["text"]["notes"].calls[4:] == [(4, None, None), (5, 4.5, 10.0)]
+
+
+def test_handler_cache_restores_its_state(namespace):
+    from neptune.types import File
+
+    handlers = HandlerCache(namespace)
+    handlers.append("text", "notes", "a", step=3)
+    handlers.upload_unique("audio", "clip", "1", File.from_content(b"a", extension="wav"))
+
+    resumed = HandlerCache(namespace)
+    resumed.restore(json.loads(json.dumps(handlers.state())))
+    resumed.append("text", "notes", "b", step=1)
+    resumed.upload_unique("audio", "clip", "1", File.from_content(b"b", extension="wav"))
+
+    assert namespace["text"]["notes"].calls[-1] == ("b", 3.5, None)
+    assert list(namespace["audio"]["clip"].children) == ["1", "1_1"]
+
+
+def test_handler_cache_is_repeated(namespace):
+    handlers = HandlerCache(namespace)
+
+    assert [handlers.is_repeated("figure", "f", digest) for digest in (b"a", b"b", b"a", b"b")] == [
+        False,
+        False,
+        True,
+        True,
+    ]
+    # the graph only holds its last upload
+    assert [handlers.is_repeated("graph", None, digest, series=False) for digest in (b"a", b"a", b"b", b"a")] == [
+        False,
+        True,
+        False,
+        False,
+    ]
+
+
+def test_content_cache_evicts_by_size():
+    cache = ContentCache(max_bytes=10)
+
+    cache.put(b"a", "payload a", 4)
+    cache.put(b"b", "payload b", 4)
+    assert cache.get(b"a") == "payload a"
+
+    cache.put(b"c", "payload c", 4)
+    assert cache.get(b"b") is None
+    assert (cache.get(b"a"), cache.get(b"c")) == ("payload a", "payload c")
+
+    uploads = ContentCache()
+    assert not uploads.add(b"upload")
+    assert uploads.add(b"upload")
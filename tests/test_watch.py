@@ -0,0 +1,144 @@
+import time
+
+import pytest
+from tensorboard.compat.proto.event_pb2 import Event
+from tensorboard.compat.proto.summary_pb2 import Summary
+from tensorboard.summary.writer.record_writer import RecordWriter
+
+from neptune_tensorboard.sync import watch
+from neptune_tensorboard.sync.watch import EventFileWatcher
+
+
+def test_polling_watcher(tmp_path, monkeypatch):
+    monkeypatch.setattr(watch, "IS_WATCHDOG_AVAILABLE", None)
+
+    existing = tmp_path / "events.out.tfevents.1"
+    existing.write_bytes(b"a")
+    (tmp_path / "checkpoint").write_bytes(b"not an event file")
+
+    watcher = EventFileWatcher(str(tmp_path))
+    assert watcher.changed_files() == [str(existing)]
+    assert watcher.changed_files() == []
+
+    with open(existing, "ab") as file:
+        file.write(b"b")
+    (tmp_path / "validation").mkdir()
+    created = tmp_path / "validation" / "events.out.tfevents.2"
+    created.write_bytes(b"c")
+
+    assert watcher.changed_files() == [str(existing), str(created)]
+    assert watcher.changed_files() == []
+    watcher.close()
+
+
+def test_watchdog_watcher(tmp_path):
+    pytest.importorskip("watchdog")
+
+    existing = tmp_path / "events.out.tfevents.1"
+    existing.write_bytes(b"a")
+
+    watcher = EventFileWatcher(str(tmp_path))
+    try:
+        assert watcher.changed_files() == [str(existing)]
+
+        (tmp_path / "checkpoint").write_bytes(b"not an event file")
+        with open(existing, "ab") as file:
+            file.write(b"b")
+
+        deadline = time.monotonic() + 10
+        changed = []
+        while not changed and time.monotonic() < deadline:
+            time.sleep(0.05)
+            changed = watcher.changed_files()
+        assert changed == [str(existing)]
+    finally:
+        watcher.close()
+
+
+def _append_scalar(path, step):
+    # NOTE: Written synchronously, unlike with a `SummaryWriter`, so the watcher sees the event right away.
+    summary = Summary(value=[Summary.Value(tag="loss", simple_value=1 / step)])
+    with open(path, "ab") as file:
+        RecordWriter(file).write(Event(wall_time=time.time(), step=step, summary=summary).SerializeToString())
+
+
+class _ScriptedClock:
+    """Stands in for the `time` module of the exporter, running a step of the script on every tick."""
+
+    def __init__(self, script):
+        self._script = iter(script)
+        self._now = 0.0
+
+    def monotonic(self):
+        return self._now
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        elapsed = next(self._script)()
+        self._now += seconds if elapsed is None else elapsed
+
+
+def test_data_sync_watch(tmp_path, monkeypatch):
+    from neptune.handler import Handler
+
+    from neptune_tensorboard.sync import sync_impl
+
+    monkeypatch.setattr(watch, "IS_WATCHDOG_AVAILABLE", None)
+
+    train, validation = (tmp_path / "experiment" / name / "events.out.tfevents.1" for name in ("train", "validation"))
+    for path in (train, validation):
+        path.parent.mkdir(parents=True)
+        _append_scalar(path, 1)
+
+    log = []
+    monkeypatch.setattr(
+        Handler, "extend", lambda self, values, **kwargs: log.append(("extend", self._path, kwargs["steps"]))
+    )
+    init_run, stop_run = sync_impl.DataSync._init_run, sync_impl.DataSync._stop_run
+    monkeypatch.setattr(
+        sync_impl.DataSync, "_init_run", lambda self, run_id: log.append(("init",)) or init_run(self, run_id)
+    )
+    monkeypatch.setattr(
+        sync_impl.DataSync, "_stop_run", lambda self, run, source: log.append(("stop",)) or stop_run(self, run, source)
+    )
+
+    def write(step):
+        return lambda: _append_scalar(train, step)
+
+    def idle(seconds):
+        return lambda: seconds
+
+    def interrupt():
+        raise KeyboardInterrupt
+
+    script = [
+        # the file grows while its export is open
+        write(2),
+        # only validation stays idle for long enough
+        idle(9.5),
+        # train has been idle for long enough, which closes the run
+        idle(5),
+        # the file grows again after its export was closed
+        write(3),
+        interrupt,
+    ]
+    monkeypatch.setattr(sync_impl, "time", _ScriptedClock(script))
+
+    data_sync = sync_impl.DataSync(project=None, api_token=None, path=str(tmp_path), group_by="run_dir", mode="debug")
+    data_sync.watch(idle_timeout=10, poll_interval=1)
+
+    assert log == [
+        # both files are exported to the run of their run directory
+        ("init",),
+        ("extend", "tensorboard/train/scalar/loss", [1]),
+        ("extend", "tensorboard/validation/scalar/loss", [1]),
+        ("extend", "tensorboard/train/scalar/loss", [2]),
+        # the run is only stopped once both of its files are idle
+        ("stop",),
+        # the export of the file is resumed where it stopped
+        ("init",),
+        ("extend", "tensorboard/train/scalar/loss", [3]),
+        ("stop",),
+    ]